@@ -15,5 +15,8 @@ export ANTHROPIC_API_KEY='YOUR_ANTHROPIC_API_KEY_HERE'
 cd /home/ubuntu/newspaper_project
 python3 newsbrief_batch_ebs.py >> $LOG_FILE 2>&1
 
+# Correct any drift in the incrementally maintained /api/stats counters
+python3 feed_stats_ebs.py reconcile >> $LOG_FILE 2>&1
+
 echo "Completed at $(date)" >> $LOG_FILE
 echo "" >> $LOG_FILE
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Dedup Bloom EBS - Memory-mapped Bloom filter in front of the dedup registry (dedup_registry_ebs.py)
+Every process maps the same bit array, so a fresh id is rejected from shared memory without a
+database lookup; only "maybe" answers reach SQLite. The registry sets bits under its write lock
+before committing, so the filter never misses a committed id.
+
+    python3 dedup_bloom_ebs.py size --capacity 1000000 --fp-rate 0.001
+    python3 dedup_bloom_ebs.py rebuild [--capacity N]
+    python3 dedup_bloom_ebs.py stats [--probes 100000]
+"""
+import argparse
+import math
+import mmap
+import os
+import struct
+import uuid
+from hashlib import blake2b
+
+import numpy as np
+
+BLOOM_CAPACITY = int(os.getenv('EBS_TRACKER_BLOOM_CAPACITY', '1000000'))
+BLOOM_FP_RATE = float(os.getenv('EBS_TRACKER_BLOOM_FP_RATE', '0.001'))
+
+MAGIC = b'EBSBLOOM'
+FORMAT_VERSION = 1
+# magic, format version, retired, bit count, hash count, capacity, items
+HEADER = struct.Struct('<8sIIQIQQ')
+HEADER_BYTES = 64
+RETIRED_OFFSET = 12
+ITEMS_OFFSET = HEADER.size - 8
+# Keys hashed per step when filling a new filter
+BUILD_CHUNK = 100000
+
+
+def bloom_size(capacity, fp_rate):
+    """(bits, hashes) for capacity items at fp_rate"""
+    bits = max(64, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+    bits = (bits + 7) // 8 * 8
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+def _hash_pairs(keys):
+    digests = b''.join(blake2b(key.encode('utf-8'), digest_size=16).digest() for key in keys)
+    pairs = np.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1] | np.uint64(1)
+
+
+def bloom_key(kind, item_id):
+    return f"{kind}\x1f{item_id}"
+
+
+class BloomFilter:
+    """A Bloom filter file mapped shared; callers serialize add() across processes"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r+b') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0)
+        magic, version, _, self.bits, self.hashes, self.capacity, _ = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != FORMAT_VERSION or len(self._mmap) != HEADER_BYTES + self.bits // 8:
+            self._mmap.close()
+            raise ValueError(f"Not a dedup Bloom filter: {path}")
+        self._array = np.frombuffer(self._mmap, dtype=np.uint8, offset=HEADER_BYTES)
+        self._rounds = np.arange(self.hashes, dtype=np.uint64)
+
+    @classmethod
+    def create(cls, path, keys=(), capacity=BLOOM_CAPACITY, fp_rate=BLOOM_FP_RATE):
+        """Write a new filter holding keys and swap it in atomically; processes mapping the
+        previous file see it marked retired and reopen"""
+        keys = list(keys)
+        bits, hashes = bloom_size(capacity, fp_rate)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, bits, hashes, capacity, 0).ljust(HEADER_BYTES, b'\0'))
+            f.truncate(HEADER_BYTES + bits // 8)
+        bloom = cls(tmp_path)
+        for start in range(0, len(keys), BUILD_CHUNK):
+            bloom.add(keys[start:start + BUILD_CHUNK])
+        bloom.items = len(keys)
+        bloom._mmap.flush()
+        try:
+            previous = cls(path)
+        except (OSError, ValueError, struct.error):
+            previous = None
+        os.replace(tmp_path, path)
+        bloom.path = path
+        if previous is not None:
+            previous.retire()
+        return bloom
+
+    @property
+    def items(self):
+        return struct.unpack_from('<Q', self._mmap, ITEMS_OFFSET)[0]
+
+    @items.setter
+    def items(self, value):
+        struct.pack_into('<Q', self._mmap, ITEMS_OFFSET, value)
+
+    @property
+    def retired(self):
+        return struct.unpack_from('<I', self._mmap, RETIRED_OFFSET)[0] != 0
+
+    def retire(self):
+        struct.pack_into('<I', self._mmap, RETIRED_OFFSET, 1)
+        self.close()
+
+    def close(self):
+        self._array = None
+        self._mmap.close()
+
+    def _positions(self, keys):
+        h1, h2 = _hash_pairs(keys)
+        with np.errstate(over='ignore'):
+            positions = (h1[:, None] + self._rounds[None, :] * h2[:, None]) % np.uint64(self.bits)
+        return positions
+
+    def add(self, keys):
+        if not keys:
+            return
+        positions = self._positions(keys).ravel()
+        np.bitwise_or.at(self._array, (positions >> np.uint64(3)).astype(np.int64),
+                         (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+
+    def might_contain(self, keys):
+        """Boolean array: False means the key was never added"""
+        if not keys:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(keys)
+        bytes_ = self._array[(positions >> np.uint64(3)).astype(np.int64)]
+        return ((bytes_ >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+
+    def fill_ratio(self):
+        return int(np.unpackbits(self._array).sum()) / self.bits
+
+    def expected_fp_rate(self):
+        """False-positive rate predicted from the current fill"""
+        return self.fill_ratio() ** self.hashes
+
+
+def main():
+    from dedup_registry_ebs import DedupRegistry
+
+    parser = argparse.ArgumentParser(description='Size, rebuild or inspect the dedup Bloom filter')
+    parser.add_argument('command', choices=['size', 'rebuild', 'stats'])
+    parser.add_argument('--capacity', type=int, help=f"items (default: {BLOOM_CAPACITY}; rebuild uses at least twice the registry)")
+    parser.add_argument('--fp-rate', type=float, default=BLOOM_FP_RATE)
+    parser.add_argument('--probes', type=int, default=100000, help='absent ids probed to measure the FP rate')
+    args = parser.parse_args()
+
+    if args.command == 'size':
+        capacity = args.capacity or BLOOM_CAPACITY
+        bits, hashes = bloom_size(capacity, args.fp_rate)
+        print(f"{capacity} items at {args.fp_rate:g}: {bits} bits ({bits / 8 / 1024 / 1024:.1f} MB), {hashes} hashes")
+        return
+
+    registry = DedupRegistry()
+    if args.command == 'rebuild':
+        bloom = registry.rebuild_bloom(args.capacity, args.fp_rate)
+        print(f"🧮 {bloom.path}: {bloom.items} ids, capacity {bloom.capacity}, "
+              f"{bloom.bits / 8 / 1024 / 1024:.1f} MB, {bloom.hashes} hashes")
+        return
+
+    bloom = registry.bloom()
+    if bloom is None:
+        print('Bloom filter disabled (EBS_TRACKER_BLOOM=off)')
+        return
+    probes = [bloom_key('probe', uuid.uuid4().hex) for _ in range(args.probes)]
+    measured = float(bloom.might_contain(probes).mean()) if probes else 0.0
+    print(f"🧮 {bloom.path}: {bloom.items} ids, capacity {bloom.capacity}, {bloom.hashes} hashes, "
+          f"{bloom.fill_ratio():.1%} of bits set")
+    print(f"   FP rate: measured {measured:.2g} over {args.probes} absent ids, "
+          f"expected {bloom.expected_fp_rate():.2g}, target {args.fp_rate:g}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Dedup Registry EBS - Processed IDs shared by every fetcher (tweets, NewsBrief digests and stories)
+One SQLite database in WAL mode: writers from separate cron processes are serialized by SQLite's
+own file locking, readers never block. Each process caches the ids it has seen processed;
+batched contains_many/add_many cost one query round for a whole fetch. A shared Bloom filter
+(dedup_bloom_ebs.py, EBS_TRACKER_BLOOM=off to disable) answers most misses without a query.
+Ids older than their fetcher's window are evicted once unified_feed holds them, so the
+registry stays bounded; the fetchers run that (maintain) at most every EBS_TRACKER_COMPACT_HOURS.
+
+    python3 dedup_registry_ebs.py stats
+    python3 dedup_registry_ebs.py compact [--email-window 7] [--tweet-window 7] [--dry-run]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import struct
+from datetime import datetime, timedelta
+from threading import Lock
+
+import lancedb
+
+from dedup_bloom_ebs import BLOOM_CAPACITY, BLOOM_FP_RATE, BloomFilter, bloom_key
+from feed_indexes_ebs import LOOKUP_CHUNK, existing_ids, sql_quote
+
+TRACKER_FILE = os.getenv('EBS_TRACKER_FILE', 'processed_ids_ebs.json')
+REGISTRY_DB = os.getenv('EBS_TRACKER_DB', 'processed_ids_ebs.sqlite3')
+BLOOM_ENABLED = os.getenv('EBS_TRACKER_BLOOM', 'on').lower() not in ('0', 'off', 'false', 'no')
+KINDS = ('newsbrief_digests', 'newsbrief_stories', 'tweets')
+# SQLite's default limit on host parameters is 999 on older builds
+QUERY_CHUNK = 900
+
+DB_URI = os.getenv('EBS_LANCEDB_PATH', '/mnt/lancedb_clean')
+TABLE_NAME = os.getenv('EBS_LANCEDB_TABLE', 'unified_feed')
+# Days back each fetcher can see an item again: NewsBrief searches FETCH_WINDOW_DAYS, the Twitter
+# list only returns recent tweets. Ids are kept RETENTION_GRACE_DAYS longer than that.
+FETCH_WINDOWS = {
+    'newsbrief_digests': 7,
+    'newsbrief_stories': 7,
+    'tweets': int(os.getenv('EBS_TRACKER_TWEET_WINDOW_DAYS', '7')),
+}
+RETENTION_GRACE_DAYS = int(os.getenv('EBS_TRACKER_RETENTION_GRACE_DAYS', '7'))
+COMPACT_INTERVAL_HOURS = float(os.getenv('EBS_TRACKER_COMPACT_HOURS', '24'))
+# VACUUM once this share of the database file is free pages
+VACUUM_FREE_RATIO = 0.25
+
+
+def covered_ids(table, kind, ids):
+    """ids unified_feed already holds: row ids for tweets and stories, parent_id for digests"""
+    if kind != 'newsbrief_digests':
+        return existing_ids(table, ids)
+    if 'parent_id' not in table.schema.names:
+        return set()
+    found = set()
+    for start in range(0, len(ids), LOOKUP_CHUNK):
+        chunk = ids[start:start + LOOKUP_CHUNK]
+        id_list = ', '.join(sql_quote(item_id) for item_id in chunk)
+        result = table.search().where(f"parent_id IN ({id_list})").select(['parent_id']).limit(None).to_arrow()
+        found.update(result.column('parent_id').to_pylist())
+    return found
+
+
+class DedupRegistry:
+    """Processed IDs by kind; ids leave only through evict() (retention)"""
+
+    def __init__(self, path=REGISTRY_DB, legacy_json=TRACKER_FILE, bloom=BLOOM_ENABLED):
+        self.path = path
+        self.legacy_json = legacy_json
+        self.bloom_path = f"{path}.bloom" if bloom else None
+        self._lock = Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._bloom = None
+        # kind -> ids this process has seen processed; only ids past retention are removed,
+        # so a hit never needs the database and only misses are looked up (primary key)
+        self._cache = {}
+
+    def _connect(self):
+        """The process's connection; reopened after a fork"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS processed_ids (
+                    kind TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    processed_at TEXT NOT NULL,
+                    PRIMARY KEY (kind, item_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute('CREATE TABLE IF NOT EXISTS registry_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self._import_json(conn)
+            self._conn, self._conn_pid = conn, os.getpid()
+            self._bloom = None
+            self._cache.clear()
+        return self._conn
+
+    @staticmethod
+    def _meta(conn, key):
+        row = conn.execute('SELECT value FROM registry_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO registry_meta VALUES (?, ?)', (key, value))
+
+    def _import_json(self, conn):
+        """One-off import of the JSON tracker; recorded so a registry emptied by retention is not refilled"""
+        if self._meta(conn, 'json_imported') is not None:
+            return
+        tracker = {}
+        if self.legacy_json and os.path.exists(self.legacy_json):
+            try:
+                with open(self.legacy_json, 'r') as f:
+                    tracker = json.load(f)
+            except (OSError, ValueError):
+                tracker = {}
+        imported_at = tracker.get('last_updated') or datetime.now().isoformat()
+        # IMMEDIATE takes the write lock first, so two processes starting together import once
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Registries created before the marker existed were imported into while empty
+            if (self._meta(conn, 'json_imported') is None
+                    and conn.execute('SELECT 1 FROM processed_ids LIMIT 1').fetchone() is None):
+                for kind in KINDS:
+                    conn.executemany('INSERT OR IGNORE INTO processed_ids VALUES (?, ?, ?)',
+                                     ((kind, str(item_id), imported_at) for item_id in tracker.get(kind, [])))
+            self._set_meta(conn, 'json_imported', datetime.now().isoformat())
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _known(self, kind):
+        return self._cache.setdefault(kind, set())
+
+    def _current_bloom(self, conn):
+        """The mapped filter, reopened when another process swapped in a rebuild; call outside a transaction"""
+        if self.bloom_path is None:
+            return None
+        if self._bloom is None or self._bloom.retired:
+            try:
+                bloom = BloomFilter(self.bloom_path)
+            except (OSError, ValueError, struct.error):
+                bloom = None
+            count = conn.execute('SELECT COUNT(*) FROM processed_ids').fetchone()[0]
+            # Ids written without the filter (JSON import, a crash before commit) or past its capacity
+            if bloom is None or bloom.items != count or count > bloom.capacity:
+                bloom = self._rebuild_bloom(conn)
+            self._bloom = bloom
+        return self._bloom
+
+    def _rebuild_bloom(self, conn, capacity=None, fp_rate=BLOOM_FP_RATE):
+        # Holding the write lock: no id can be committed between the scan and the swap
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            keys = [bloom_key(kind, item_id) for kind, item_id in conn.execute('SELECT kind, item_id FROM processed_ids')]
+            bloom = BloomFilter.create(self.bloom_path, keys, max(capacity or BLOOM_CAPACITY, 2 * len(keys)), fp_rate)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._bloom = bloom
+        return bloom
+
+    def rebuild_bloom(self, capacity=None, fp_rate=BLOOM_FP_RATE):
+        """Rebuild the Bloom filter from the registry, sized for at least twice its current ids"""
+        with self._lock:
+            return self._rebuild_bloom(self._connect(), capacity, fp_rate)
+
+    def bloom(self):
+        with self._lock:
+            return self._current_bloom(self._connect())
+
+    def contains_many(self, kind, item_ids):
+        """The subset of item_ids already processed"""
+        item_ids = {str(item_id) for item_id in item_ids}
+        with self._lock:
+            conn = self._connect()
+            known = self._known(kind)
+            found = item_ids & known
+            missing = sorted(item_ids - found)
+            bloom = self._current_bloom(conn)
+            if bloom is not None and missing:
+                # A Bloom "no" is definite: only possible hits are looked up
+                maybe = bloom.might_contain([bloom_key(kind, item_id) for item_id in missing])
+                missing = [item_id for item_id, hit in zip(missing, maybe) if hit]
+            for start in range(0, len(missing), QUERY_CHUNK):
+                chunk = missing[start:start + QUERY_CHUNK]
+                rows = conn.execute(
+                    f"SELECT item_id FROM processed_ids WHERE kind = ? AND item_id IN ({','.join('?' * len(chunk))})",
+                    [kind, *chunk]
+                )
+                found.update(row[0] for row in rows)
+            known.update(found)
+        return found
+
+    def contains(self, kind, item_id):
+        return str(item_id) in self.contains_many(kind, [item_id])
+
+    def add_many(self, kind, item_ids):
+        """Record item_ids as processed in one transaction; returns the ids that were new"""
+        item_ids = {str(item_id) for item_id in item_ids}
+        now = datetime.now().isoformat()
+        with self._lock:
+            conn = self._connect()
+            known = self._known(kind)
+            candidates = sorted(item_ids - known)
+            if not candidates:
+                return set()
+            bloom = self._current_bloom(conn)
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if bloom is not None and bloom.retired:
+                    # Rebuilt by another process since it was opened; the new file is current
+                    bloom = self._bloom = BloomFilter(self.bloom_path)
+                if bloom is not None:
+                    # Bits go in before the commit so a reader never misses a committed id
+                    bloom.add([bloom_key(kind, item_id) for item_id in candidates])
+                added = set()
+                for item_id in candidates:
+                    if conn.execute('INSERT OR IGNORE INTO processed_ids VALUES (?, ?, ?)',
+                                    (kind, item_id, now)).rowcount:
+                        added.add(item_id)
+                if bloom is not None:
+                    bloom.items += len(added)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            known.update(candidates)
+        return added
+
+    def add(self, kind, item_id):
+        return bool(self.add_many(kind, [item_id]))
+
+    def ids(self, kind):
+        """Every processed id of kind"""
+        with self._lock:
+            rows = self._connect().execute('SELECT item_id FROM processed_ids WHERE kind = ?', (kind,))
+            return {row[0] for row in rows}
+
+    def last_updated(self):
+        with self._lock:
+            return self._connect().execute('SELECT MAX(processed_at) FROM processed_ids').fetchone()[0]
+
+    def counts(self):
+        with self._lock:
+            rows = self._connect().execute('SELECT kind, COUNT(*) FROM processed_ids GROUP BY kind')
+            return dict(rows.fetchall())
+
+    def expired(self, kind, window_days):
+        """Ids of kind processed longer ago than window_days + RETENTION_GRACE_DAYS"""
+        cutoff = (datetime.now() - timedelta(days=window_days + RETENTION_GRACE_DAYS)).isoformat()
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT item_id FROM processed_ids WHERE kind = ? AND processed_at < ?', (kind, cutoff)
+            )
+            return [row[0] for row in rows]
+
+    def evict(self, kind, item_ids):
+        """Remove item_ids of kind; returns how many rows went"""
+        item_ids = [str(item_id) for item_id in item_ids]
+        if not item_ids:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                removed = conn.executemany('DELETE FROM processed_ids WHERE kind = ? AND item_id = ?',
+                                           ((kind, item_id) for item_id in item_ids)).rowcount
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            self._known(kind).difference_update(item_ids)
+        return removed
+
+    def compact(self, evicted=0, log=print):
+        """Fold the WAL back, VACUUM once a quarter of the file is free pages or a quarter of the
+        rows present at the last VACUUM have been evicted (evictions spread over the key range
+        leave half-empty pages rather than free ones), and rebuild the Bloom filter so it holds
+        only the ids that are left"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            rows = conn.execute('SELECT COUNT(*) FROM processed_ids').fetchone()[0]
+            pages = conn.execute('PRAGMA page_count').fetchone()[0]
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            vacuumed_rows = int(self._meta(conn, 'vacuumed_rows') or rows + evicted)
+            before = os.path.getsize(self.path)
+            if (pages and free / pages >= VACUUM_FREE_RATIO) or rows <= vacuumed_rows * (1 - VACUUM_FREE_RATIO):
+                conn.execute('VACUUM')
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                vacuumed_rows = rows
+            self._set_meta(conn, 'vacuumed_rows', str(vacuumed_rows))
+            if self.bloom_path is not None:
+                self._rebuild_bloom(conn)
+        log(f"   🗜️  Registry {rows} ids, {before / 1024 / 1024:.1f} -> {os.path.getsize(self.path) / 1024 / 1024:.1f} MB")
+
+    def _claim_maintenance(self, key, force):
+        """True for the one process that gets to run maintenance for key this interval"""
+        now = datetime.now()
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                last = self._meta(conn, key)
+                due = force or last is None or now - datetime.fromisoformat(last) >= timedelta(hours=COMPACT_INTERVAL_HOURS)
+                if due:
+                    self._set_meta(conn, key, now.isoformat())
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return due
+
+    def maintain(self, table, windows, log=print, force=False, dry_run=False):
+        """Evict ids of each kind in windows ({kind: fetch window days}) that are past retention
+        and already in table, then compact; a no-op until COMPACT_INTERVAL_HOURS have passed"""
+        if not dry_run and not self._claim_maintenance(f"maintained:{','.join(sorted(windows))}", force):
+            return 0
+        evicted = 0
+        for kind, window_days in windows.items():
+            candidates = self.expired(kind, window_days)
+            # Only ids LanceDB confirms: anything else could still be fetched and inserted again
+            covered = covered_ids(table, kind, candidates) if candidates else set()
+            log(f"   🧹 {kind}: {len(candidates)} past {window_days}+{RETENTION_GRACE_DAYS} days, "
+                f"{len(covered)} stored in {table.name}")
+            if not dry_run:
+                evicted += self.evict(kind, covered)
+        if not dry_run:
+            self.compact(evicted, log=log)
+        return evicted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or compact the dedup registry')
+    parser.add_argument('command', nargs='?', choices=['stats', 'compact'], default='stats')
+    parser.add_argument('--email-window', type=int, default=FETCH_WINDOWS['newsbrief_digests'])
+    parser.add_argument('--tweet-window', type=int, default=FETCH_WINDOWS['tweets'])
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    registry = DedupRegistry()
+    if args.command == 'compact':
+        table = lancedb.connect(DB_URI).open_table(TABLE_NAME)
+        windows = {'newsbrief_digests': args.email_window, 'newsbrief_stories': args.email_window,
+                   'tweets': args.tweet_window}
+        print(f"🗂️  Compacting {registry.path} against {TABLE_NAME} at {DB_URI}")
+        evicted = registry.maintain(table, windows, force=True, dry_run=args.dry_run)
+        print(f"   ✅ Evicted {evicted} ids" if not args.dry_run else '   (dry run, nothing evicted)')
+
+    counts = registry.counts()
+    print(f"🗂️  {registry.path}: {os.path.getsize(registry.path) / 1024 / 1024:.1f} MB")
+    for kind in sorted(set(KINDS) | set(counts)):
+        print(f"   {kind}: {counts.get(kind, 0)}")
+
+
+if __name__ == '__main__':
+    main()
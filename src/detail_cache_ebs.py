@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Detail Cache EBS - Byte-bounded LRU of serialized /api/email/<item_id> payloads
+Rows are INSERT-only, so an entry only goes stale through the junk/attention endpoints
+"""
+from collections import OrderedDict
+from threading import Lock
+
+
+class ByteLRUCache:
+    """LRU keyed by item id whose capacity is the total size of the cached bytes values"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        # Anything larger than a quarter of the budget would just flush the hot set
+        if len(value) > self.max_bytes // 4:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def invalidate(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
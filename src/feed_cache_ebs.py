@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Feed Cache EBS - Process-wide snapshot of /api/feed keyed on the LanceDB table version
+unified_feed is INSERT-only, so a snapshot stays valid until the table version moves
+"""
+import base64
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+
+import numpy as np
+
+SOURCE_TYPES = ('email', 'tweet')
+FIELD_SETS = ('list', 'full')
+VERSION_IDS_CACHE_SIZE = 8
+NAT_SORT_KEY = np.iinfo(np.int64).min
+
+
+def feed_where(source_filter='all', view='default', flagged_ids=()):
+    """LanceDB where clause for the /api/feed source and view filters
+
+    Rows whose junk flag is overridden in item_flags are always read so the caller
+    can apply the overlay and re-filter on the effective value.
+    """
+    clauses = []
+    if source_filter in SOURCE_TYPES:
+        clauses.append(f"source_type = '{source_filter}'")
+    junk = 'is_junk = true' if view == 'junk' else '(is_junk IS NULL OR is_junk = false)'
+    if flagged_ids:
+        id_list = ', '.join("'" + str(item_id).replace("'", "''") + "'" for item_id in flagged_ids)
+        junk = f"({junk} OR id IN ({id_list}))"
+    clauses.append(junk)
+    return ' AND '.join(clauses)
+
+
+def encode_cursor(sort_key, item_id):
+    raw = f"{int(sort_key)}|{item_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return (sort_key, id) for a cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        sort_key, item_id = raw.split('|', 1)
+        return int(sort_key), item_id
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _positions(ids, wanted, member):
+    """Positions whose id is (member=True) or is not in wanted; a set probe per row, because
+    np.isin on object arrays degrades badly when both sides hold ~100k strings"""
+    wanted = wanted if isinstance(wanted, (set, frozenset)) else set(wanted)
+    return np.flatnonzero(np.fromiter(((item_id in wanted) == member for item_id in ids), dtype=bool, count=len(ids)))
+
+
+def _take(items, positions):
+    """items at positions; lazily formatted items (feed_snapshot_file_ebs.LazyItems) stay lazy"""
+    if hasattr(items, 'take'):
+        return items.take(positions)
+    return [items[pos] for pos in positions]
+
+
+class FeedSnapshot:
+    """Formatted feed items for one table version, ordered by (created_at, id) descending"""
+
+    def __init__(self, version, sort_keys, ids, items, flags_version=0):
+        self.version = version
+        self.flags_version = flags_version
+        # created_at as int64 nanoseconds (NaT sorts last), row-aligned with items
+        self.sort_keys = sort_keys
+        self.ids = ids
+        self.items = items
+        self.built_at = datetime.now().isoformat()
+
+    def page(self, cursor=None, limit=None):
+        """Keyset page: items strictly after cursor, plus the cursor for the following page"""
+        start = 0
+        if cursor:
+            sort_key, item_id = decode_cursor(cursor)
+            after = (self.sort_keys < sort_key) | ((self.sort_keys == sort_key) & (self.ids < item_id))
+            # Rows after the cursor form a suffix of the sorted snapshot
+            start = int(np.argmax(after)) if after.any() else len(self.items)
+
+        end = len(self.items) if not limit or limit <= 0 else min(start + limit, len(self.items))
+        next_cursor = None
+        if end < len(self.items) and end > start:
+            next_cursor = encode_cursor(self.sort_keys[end - 1], self.ids[end - 1])
+        return self.items[start:end], next_cursor
+
+    def newer_than(self, sort_key):
+        """Items whose created_at is strictly after sort_key (a prefix of the snapshot)"""
+        end = int((self.sort_keys > sort_key).sum())
+        return self.items[:end]
+
+    def between(self, start=None, end=None):
+        """Sub-snapshot with start <= created_at < end (int64 ns); a contiguous slice of the snapshot"""
+        ascending = self.sort_keys[::-1]
+        total = len(ascending)
+        # Rows without a created_at (NaT, the int64 minimum) sit at the end and never match a range
+        lo = 0 if end is None else total - int(np.searchsorted(ascending, end, side='left'))
+        floor = NAT_SORT_KEY + 1 if start is None else start
+        hi = max(lo, total - int(np.searchsorted(ascending, floor, side='left')))
+        items = self.items.take(np.arange(lo, hi)) if hasattr(self.items, 'take') else self.items[lo:hi]
+        subset = FeedSnapshot(self.version, self.sort_keys[lo:hi], self.ids[lo:hi], items, self.flags_version)
+        subset.built_at = self.built_at
+        return subset
+
+    def including(self, ids):
+        """Sub-snapshot of the items whose id is in ids, order preserved"""
+        positions = _positions(self.ids, ids, True)
+        subset = FeedSnapshot(self.version, self.sort_keys[positions], self.ids[positions],
+                              _take(self.items, positions), self.flags_version)
+        subset.built_at = self.built_at
+        return subset
+
+    def excluding(self, ids):
+        """Items whose id is not in ids, e.g. rows inserted after an older table version"""
+        return _take(self.items, _positions(self.ids, ids, False))[:]
+
+
+class FeedSnapshotCache:
+    """Shares FeedSnapshots across requests, rebuilding one only when the table version changes"""
+
+    def __init__(self, builder, mapped=None):
+        # builder(table, where, fields, view, overlay) -> (sort_keys, ids, items) for the
+        # matching rows with the flag overlay applied, newest first
+        # mapped(version, source_filter, view, overlay) -> the same for the list view from the
+        # shared snapshot file, or None when that file does not match version
+        self._builder = builder
+        self._mapped = mapped
+        self._snapshots = {}
+        self._version_ids = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, table, source_filter='all', view='default', fields='list', overlay=None, extra_where=None):
+        """Shared snapshot for the filters; with extra_where a one-off snapshot that is not cached"""
+        key = (
+            source_filter if source_filter in SOURCE_TYPES else 'all',
+            'junk' if view == 'junk' else 'default',
+            fields if fields in FIELD_SETS else 'list'
+        )
+        version = table.version
+        flags_version = overlay.version if overlay is not None else 0
+        if extra_where:
+            return self._build(table, key, version, overlay, extra_where)
+
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.version >= version and snapshot.flags_version == flags_version:
+            return snapshot
+
+        with self._lock:
+            # Another request may have rebuilt while we waited for the lock
+            snapshot = self._snapshots.get(key)
+            if snapshot is None or snapshot.version < version or snapshot.flags_version != flags_version:
+                snapshot = self._build(table, key, version, overlay)
+                self._snapshots[key] = snapshot
+            return snapshot
+
+    def _build(self, table, key, version, overlay, extra_where=None):
+        flags_version = overlay.version if overlay is not None else 0
+        if self._mapped is not None and not extra_where and key[2] == 'list':
+            built = self._mapped(version, key[0], key[1], overlay)
+            if built is not None:
+                return FeedSnapshot(version, *built, flags_version)
+
+        flagged_ids = overlay.ids('is_junk') if overlay is not None else ()
+        where = feed_where(key[0], key[1], flagged_ids)
+        if extra_where:
+            where = f"{where} AND ({extra_where})"
+        sort_keys, ids, items = self._builder(table, where, key[2], key[1], overlay)
+        return FeedSnapshot(version, sort_keys, ids, items, flags_version)
+
+    def ids_at(self, version, loader):
+        """Set of ids present at an older table version; versions are immutable so results are kept"""
+        with self._lock:
+            ids = self._version_ids.get(version)
+            if ids is not None:
+                self._version_ids.move_to_end(version)
+                return ids
+
+        ids = loader(version)
+        with self._lock:
+            self._version_ids[version] = ids
+            while len(self._version_ids) > VERSION_IDS_CACHE_SIZE:
+                self._version_ids.popitem(last=False)
+        return ids
+
+    def clear(self):
+        with self._lock:
+            self._snapshots = {}
+            self._version_ids = OrderedDict()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Feed Export EBS - Columnar bulk export of unified_feed as Arrow IPC stream or Parquet
+Record batches go from the LanceDB scan straight into the writer; nothing is converted to pandas or JSON
+
+    python3 feed_export_ebs.py feed.parquet --start 2025-11-01 --columns id,created_at,title,themes
+"""
+import argparse
+import os
+
+import lancedb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from feed_cache_ebs import SOURCE_TYPES
+from feed_schema_ebs import created_at_is_typed, time_range_where
+from item_flags_ebs import FLAGS, EMPTY_OVERLAY, FlagOverlayCache, junk_where
+
+DB_URI = os.getenv('EBS_LANCEDB_PATH', '/mnt/lancedb_clean')
+TABLE_NAME = os.getenv('EBS_LANCEDB_TABLE', 'unified_feed')
+
+EXPORT_FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+BATCH_ROWS = 10000
+
+
+class _ChunkSink:
+    """Write-only file object whose written bytes are drained between batches"""
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_columns(table, requested=None):
+    """Validated projection: requested names in table order (all columns when None)"""
+    if not requested:
+        return list(table.schema.names)
+    unknown = [name for name in requested if name not in table.schema.names]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return [name for name in table.schema.names if name in requested]
+
+
+def export_where(table, source_filter='all', start=None, end=None, junk='exclude', overlay=EMPTY_OVERLAY):
+    if (start is not None or end is not None) and not created_at_is_typed(table):
+        raise ValueError('Time-range export needs a typed created_at (python3 migrate_feed_schema_ebs.py timestamps)')
+    clauses = []
+    if source_filter in SOURCE_TYPES:
+        clauses.append(f"source_type = '{source_filter}'")
+    range_where = time_range_where(table, start, end)
+    if range_where:
+        clauses.append(range_where)
+    if junk != 'all':
+        clauses.append(junk_where(overlay, junk == 'only'))
+    return ' AND '.join(clauses) or None
+
+
+def _apply_flags(batch, overlay, id_column):
+    """Stored is_junk/is_attention replaced by the effective overlay values"""
+    for flag in FLAGS:
+        if flag not in batch.schema.names or not overlay.values[flag]:
+            continue
+        marked = [item_id for item_id, value in overlay.values[flag].items() if value]
+        cleared = [item_id for item_id, value in overlay.values[flag].items() if not value]
+        stored = batch.column(flag)
+        effective = pc.if_else(pc.is_in(id_column, pa.array(marked, pa.string())), True,
+                               pc.if_else(pc.is_in(id_column, pa.array(cleared, pa.string())), False, stored))
+        batch = batch.set_column(batch.schema.get_field_index(flag), flag, effective.cast(stored.type))
+    return batch
+
+
+def iter_export(table, columns, where=None, fmt='arrow', overlay=EMPTY_OVERLAY):
+    """Encoded export bytes, one chunk per record batch"""
+    # id is read for the flag overlay even when it is not exported
+    scan_columns = columns if 'id' in columns or not set(FLAGS) & set(columns) else ['id'] + columns
+    query = table.search()
+    if where:
+        query = query.where(where)
+    reader = query.select(scan_columns).limit(None).to_batches(BATCH_ROWS)
+    schema = pa.schema([reader.schema.field(name) for name in columns])
+
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    for batch in reader:
+        if not batch.num_rows:
+            continue
+        batch = _apply_flags(batch, overlay, batch.column('id')) if 'id' in batch.schema.names else batch
+        batch = batch.select(columns)
+        if fmt == 'parquet':
+            writer.write_batch(batch, row_group_size=BATCH_ROWS)
+        else:
+            writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export unified_feed as Arrow IPC or Parquet')
+    parser.add_argument('output')
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), help='default: from the output extension')
+    parser.add_argument('--columns', help='comma-separated projection (default: all)')
+    parser.add_argument('--source', default='all')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--junk', choices=['exclude', 'only', 'all'], default='exclude')
+    args = parser.parse_args()
+
+    fmt = args.format or ('parquet' if args.output.endswith('.parquet') else 'arrow')
+    db = lancedb.connect(DB_URI)
+    table = db.open_table(TABLE_NAME)
+    overlay = FlagOverlayCache().get(db)
+    columns = export_columns(table, args.columns.split(',') if args.columns else None)
+    start = pd.to_datetime(args.start, utc=True) if args.start else None
+    end = pd.to_datetime(args.end, utc=True) if args.end else None
+    where = export_where(table, args.source, start, end, args.junk, overlay)
+
+    size = 0
+    with open(args.output, 'wb') as f:
+        for chunk in iter_export(table, columns, where, fmt, overlay):
+            f.write(chunk)
+            size += len(chunk)
+    print(f"📦 {args.output}: {size / 1024 / 1024:.1f} MB ({fmt}, table version {table.version})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Feed Indexes EBS - Scalar and full-text index management for the unified_feed table
+
+    python3 feed_indexes_ebs.py build      # create any missing indexes
+    python3 feed_indexes_ebs.py verify     # report coverage, exit 1 if something is missing or stale
+    python3 feed_indexes_ebs.py rebuild    # drop-and-recreate every index
+    python3 feed_indexes_ebs.py refresh    # fold newly inserted rows into the indexes (run after ingest)
+    python3 feed_indexes_ebs.py bench      # point-lookup latency on synthetic tables of growing size
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import lancedb
+import pyarrow as pa
+from lancedb.index import FTS, Bitmap, BTree
+
+DB_URI = os.getenv('EBS_LANCEDB_PATH', '/mnt/lancedb_clean')
+TABLE_NAME = os.getenv('EBS_LANCEDB_TABLE', 'unified_feed')
+
+# BTREE for high-cardinality point/range lookups, BITMAP for low-cardinality filters
+SCALAR_INDEXES = [
+    ('id', 'BTREE'),
+    ('created_at', 'BTREE'),
+    ('source_type', 'BITMAP'),
+    ('source', 'BITMAP'),
+    ('is_junk', 'BITMAP'),
+]
+
+SCALAR_INDEX_CONFIGS = {'BTREE': BTree, 'BITMAP': Bitmap}
+
+# Native FTS, one index per column; content is mostly Portuguese with English mixed in,
+# so tokens are Portuguese-stemmed and accents folded ("preços" matches "preco")
+FTS_COLUMNS = ['title', 'content_text', 'enriched_content']
+FTS_CONFIG = FTS(language='Portuguese', stem=True, ascii_folding=True, lower_case=True, remove_stop_words=True)
+
+LOOKUP_CHUNK = 500
+
+
+def sql_quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def existing_ids(table, ids):
+    """Subset of ids already stored in table; served by the id BTREE index instead of a full scan"""
+    ids = [str(item_id) for item_id in ids]
+    found = set()
+    for start in range(0, len(ids), LOOKUP_CHUNK):
+        chunk = ids[start:start + LOOKUP_CHUNK]
+        id_list = ', '.join(sql_quote(item_id) for item_id in chunk)
+        result = table.search().where(f"id IN ({id_list})").select(['id']).limit(None).to_arrow()
+        found.update(result.column('id').to_pylist())
+    return found
+
+
+def create_scalar_index(table, column, index_type):
+    """(Re)build a BTREE or BITMAP index on column"""
+    table.create_index(column, config=SCALAR_INDEX_CONFIGS[index_type](), replace=True)
+
+
+def _indexed_columns(table):
+    indexed = {}
+    for index in table.list_indices():
+        for column in index.columns:
+            indexed[column] = index
+    return indexed
+
+
+def build_indexes(table, replace=False, log=print):
+    indexed = _indexed_columns(table)
+    names = set(table.schema.names)
+    for column, index_type in SCALAR_INDEXES:
+        if column not in names:
+            log(f"   ⏭️  {column}: column not in schema")
+            continue
+        if column in indexed and not replace:
+            continue
+        started = time.perf_counter()
+        create_scalar_index(table, column, index_type)
+        log(f"   ✅ {column}: {index_type} built in {time.perf_counter() - started:.2f}s")
+
+    for column in FTS_COLUMNS:
+        if column not in names:
+            continue
+        if column in indexed and not replace:
+            continue
+        started = time.perf_counter()
+        table.create_index(column, config=FTS_CONFIG, replace=True)
+        log(f"   ✅ {column}: FTS built in {time.perf_counter() - started:.2f}s")
+
+
+def verify_indexes(table, log=print):
+    """Log per-index coverage; returns True when every index exists and covers every row"""
+    indexed = _indexed_columns(table)
+    names = set(table.schema.names)
+    healthy = True
+    for column, index_type in SCALAR_INDEXES + [(column, 'FTS') for column in FTS_COLUMNS]:
+        if column not in names:
+            continue
+        index = indexed.get(column)
+        if index is None:
+            log(f"   ❌ {column}: missing {index_type} index")
+            healthy = False
+            continue
+        stats = table.index_stats(index.name)
+        actual_type = str(stats.index_type).upper()
+        status = '✅'
+        if actual_type != index_type:
+            status = '⚠️'
+            healthy = False
+        if stats.num_unindexed_rows:
+            status = '⚠️'
+            healthy = False
+        log(f"   {status} {column}: {actual_type} indexed={stats.num_indexed_rows} "
+            f"unindexed={stats.num_unindexed_rows}")
+    return healthy
+
+
+def refresh_indexes(table, log=print):
+    """Merge rows appended since the last build into the existing indexes"""
+    names = set(table.schema.names)
+    wanted = {column for column, _ in SCALAR_INDEXES} | set(FTS_COLUMNS)
+    if (wanted & names) - set(_indexed_columns(table)):
+        # Build whatever is missing; the new indexes already cover every row
+        build_indexes(table, log=log)
+    started = time.perf_counter()
+    table.optimize()
+    log(f"   ✅ Indexes refreshed in {time.perf_counter() - started:.2f}s")
+
+
+def _synthetic_rows(count, offset=0):
+    return pa.table({
+        'id': [f"tweet_{offset + i}" for i in range(count)],
+        'source_type': [('tweet', 'email')[i % 2] for i in range(count)],
+        'source': [('twitter_api', 'newsbrief_story', 'email_digest')[i % 3] for i in range(count)],
+        'created_at': [f"2025-11-{1 + (offset + i) % 28:02d}T12:00:00Z" for i in range(count)],
+        'is_junk': [i % 7 == 0 for i in range(count)],
+        'content_text': ['x' * 200] * count,
+    })
+
+
+def _time_lookups(table, ids, rounds):
+    timings = []
+    for item_id in random.sample(ids, min(rounds, len(ids))):
+        started = time.perf_counter()
+        table.search().where(f"id = {sql_quote(item_id)}").limit(1).to_arrow()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def bench(sizes, rounds, log=print):
+    workdir = tempfile.mkdtemp(prefix='feed_indexes_bench_')
+    try:
+        db = lancedb.connect(workdir)
+        table = None
+        total = 0
+        log(f"{'rows':>10} {'scan p50':>10} {'scan p95':>10} {'index p50':>10} {'index p95':>10}  (ms)")
+        for size in sizes:
+            batch = _synthetic_rows(size - total, offset=total)
+            if table is None:
+                table = db.create_table('bench', batch)
+            else:
+                table.add(batch)
+            total = size
+            ids = [f"tweet_{i}" for i in range(total)]
+
+            for index in table.list_indices():
+                table.drop_index(index.name)
+            scan = _time_lookups(table, ids, rounds)
+            build_indexes(table, log=lambda message: None)
+            indexed = _time_lookups(table, ids, rounds)
+            log(f"{total:>10} {scan[0]:>10.2f} {scan[1]:>10.2f} {indexed[0]:>10.2f} {indexed[1]:>10.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage unified_feed scalar indexes')
+    parser.add_argument('command', choices=['build', 'verify', 'rebuild', 'refresh', 'bench'])
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help='bench: comma-separated synthetic table sizes')
+    parser.add_argument('--rounds', type=int, default=200, help='bench: lookups per size')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        bench([int(size) for size in args.sizes.split(',')], args.rounds)
+        return
+
+    print(f"📇 {args.command} indexes on {TABLE_NAME} at {DB_URI}")
+    table = lancedb.connect(DB_URI).open_table(TABLE_NAME)
+    if args.command == 'build':
+        build_indexes(table)
+    elif args.command == 'rebuild':
+        build_indexes(table, replace=True)
+    elif args.command == 'refresh':
+        refresh_indexes(table)
+    if not verify_indexes(table):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Feed Schema EBS - Column types of unified_feed shared by ingest, the API and migrations
+Tables migrated by migrate_feed_schema_ebs.py store created_at as timestamp[us, UTC],
+themes/actors as list<string> and custom_fields as a struct; older tables still hold
+strings, so writers and readers check which layout they face
+"""
+import json
+import re
+import unicodedata
+from datetime import timezone
+
+import pandas as pd
+import pyarrow as pa
+
+CREATED_AT_TYPE = pa.timestamp('us', tz='UTC')
+TZ_SUFFIX = r'(?:[+-]\d{2}:?\d{2}|Z)$'
+
+KEYWORD_SEPARATOR = ' • '
+KEYWORD_COLUMNS = ('themes', 'actors')
+KEYWORDS_TYPE = pa.list_(pa.string())
+
+MEDIA_TYPE = pa.list_(pa.struct([
+    ('type', pa.string()),
+    ('url', pa.string()),
+    ('thumbnail', pa.string()),
+]))
+# Union of the keys written by the twitter and newsbrief ingest scripts; anything else lands in extra (JSON)
+CUSTOM_FIELDS_TYPE = pa.struct([
+    ('display_name', pa.string()),
+    ('likes', pa.int64()),
+    ('retweets', pa.int64()),
+    ('replies', pa.int64()),
+    ('views', pa.int64()),
+    ('has_media', pa.bool_()),
+    ('media', MEDIA_TYPE),
+    ('language', pa.string()),
+    ('keywords', KEYWORDS_TYPE),
+    ('ai_score', pa.float64()),
+    ('digest_subject', pa.string()),
+    ('extra', pa.string()),
+])
+CUSTOM_FIELD_NAMES = [field.name for field in CUSTOM_FIELDS_TYPE]
+
+
+def created_at_is_typed(table):
+    field = table.schema.field('created_at') if 'created_at' in table.schema.names else None
+    return field is not None and pa.types.is_timestamp(field.type)
+
+
+def created_at_value(dt, typed):
+    """Value to store in created_at for an aware datetime: native when typed, ISO-8601 'Z' string otherwise"""
+    dt = dt.astimezone(timezone.utc)
+    if typed:
+        return dt
+    return dt.isoformat().replace('+00:00', 'Z')
+
+
+def parse_created_at(values):
+    """UTC timestamps for legacy created_at strings; naive values are read as UTC, unparseable ones become NaT"""
+    text = pd.Series(values, dtype=object).fillna('').astype(str).str.strip()
+    has_tz = text.str.contains(TZ_SUFFIX, regex=True)
+    # Parsed separately: one ISO8601 pass over mixed input applies an offset seen elsewhere to naive values
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns, UTC]')
+    parsed.loc[has_tz] = pd.to_datetime(text[has_tz], utc=True, errors='coerce', format='ISO8601')
+    parsed.loc[~has_tz] = pd.to_datetime(
+        text[~has_tz], errors='coerce', format='ISO8601'
+    ).dt.tz_localize('UTC')
+    leftovers = parsed.isna() & (text != '')
+    if leftovers.any():
+        parsed.loc[leftovers] = pd.to_datetime(
+            text[leftovers].map(lambda x: pd.to_datetime(x, utc=True, errors='coerce')), utc=True
+        )
+    return parsed
+
+
+def time_range_where(table, start=None, end=None):
+    """LanceDB predicate for start <= created_at < end (datetimes); None if unbounded or untyped"""
+    if not created_at_is_typed(table):
+        return None
+    clauses = []
+    if start is not None:
+        clauses.append(f"created_at >= {_timestamp_literal(start)}")
+    if end is not None:
+        clauses.append(f"created_at < {_timestamp_literal(end)}")
+    return ' AND '.join(clauses) or None
+
+
+def _timestamp_literal(value):
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+    return f"arrow_cast('{ts.strftime('%Y-%m-%dT%H:%M:%S.%f')}Z', 'Timestamp(Microsecond, Some(\"UTC\"))')"
+
+
+def nested_columns_enabled(table):
+    """True once migrate_feed_schema_ebs.py nested has turned themes into list<string>"""
+    return 'themes' in table.schema.names and pa.types.is_list(table.schema.field('themes').type)
+
+
+def keywords_value(keywords, nested):
+    """Store a keyword list natively (None when empty), or as the legacy ' • '-joined string"""
+    keywords = [str(keyword) for keyword in keywords or [] if str(keyword).strip()]
+    if not nested:
+        return KEYWORD_SEPARATOR.join(keywords)
+    return keywords or None
+
+
+def split_keywords(text):
+    """Legacy themes/actors string -> keyword list (None when empty)"""
+    if text is None:
+        return None
+    keywords = [part.strip() for part in str(text).split('•') if part.strip()]
+    return keywords or None
+
+
+def custom_fields_value(fields, nested):
+    """custom_fields dict as a CUSTOM_FIELDS_TYPE row, or the legacy JSON string"""
+    if not nested:
+        return json.dumps(fields)
+    fields = dict(fields or {})
+    extra = {key: fields.pop(key) for key in list(fields) if key not in CUSTOM_FIELD_NAMES or key == 'extra'}
+    row = {name: fields.get(name) for name in CUSTOM_FIELD_NAMES}
+    row['extra'] = json.dumps(extra) if extra else None
+    return row
+
+
+def normalize_keyword(text):
+    """Case- and accent-insensitive form: 'Petróleo  Brasileiro' -> 'petroleo brasileiro'"""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return re.sub(r'\s+', ' ', stripped).strip().lower()
+
+
+# Accented letters normalize_keyword folds away; the regex fallback has to accept them back
+_ACCENT_CLASSES = {
+    'a': '[aáàâãä]', 'e': '[eéèêë]', 'i': '[iíìîï]', 'o': '[oóòôõö]', 'u': '[uúùûü]', 'c': '[cç]', 'n': '[nñ]',
+}
+_REGEX_SPECIALS = set('\\.^$|?*+()[]{}')
+
+
+def _keyword_regex(keyword):
+    parts = []
+    for char in normalize_keyword(keyword):
+        if char == ' ':
+            parts.append(r'\s+')
+        elif char in _ACCENT_CLASSES:
+            parts.append(_ACCENT_CLASSES[char])
+        else:
+            parts.append('\\' + char if char in _REGEX_SPECIALS else char)
+    # One whole keyword between separators, as keyword_postings stores them
+    return r'(^|•)\s*' + ''.join(parts) + r'\s*(•|$)'
+
+
+def keyword_where(table, keyword):
+    """LanceDB predicate for items whose themes hold keyword as a whole keyword, ignoring case and
+    accents the way keyword_postings does (normalize_keyword)"""
+    pattern = "'" + _keyword_regex(keyword).replace("'", "''") + "'"
+    if nested_columns_enabled(table):
+        return f"regexp_like(array_to_string(themes, '•'), {pattern}, 'i')"
+    return f"regexp_like(themes, {pattern}, 'i')"
+
+
+def feed_rows_to_arrow(table, rows):
+    """Arrow batch of ingest rows in the table's own schema (missing columns and struct fields become null)"""
+    return pa.Table.from_pylist(rows, schema=table.schema)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Feed Search EBS - Full-text queries over the unified_feed FTS indexes (see feed_indexes_ebs.FTS_COLUMNS)
+
+    python3 feed_search_ebs.py "petrobras preços"   # top matches from the command line
+"""
+import os
+import sys
+import time
+
+import lancedb
+from lancedb.query import MultiMatchQuery
+
+from feed_cache_ebs import SOURCE_TYPES
+from feed_indexes_ebs import FTS_COLUMNS
+from feed_schema_ebs import time_range_where
+
+DB_URI = os.getenv('EBS_LANCEDB_PATH', '/mnt/lancedb_clean')
+TABLE_NAME = os.getenv('EBS_LANCEDB_TABLE', 'unified_feed')
+
+MAX_SEARCH_LIMIT = 100
+
+
+def search_where(table, source_filter='all', start=None, end=None, junk_clause=None):
+    """Prefilter for a search: source, created_at range (typed tables only) and junk status"""
+    clauses = []
+    if source_filter in SOURCE_TYPES:
+        clauses.append(f"source_type = '{source_filter}'")
+    range_where = time_range_where(table, start, end)
+    if range_where:
+        clauses.append(range_where)
+    if junk_clause:
+        clauses.append(junk_clause)
+    return ' AND '.join(clauses) or None
+
+
+def search_feed(table, text, columns, where=None, limit=20, offset=0):
+    """BM25 matches of text across the FTS columns, best first, as an Arrow table with a _score column"""
+    fts_columns = [name for name in FTS_COLUMNS if name in table.schema.names]
+    query = table.search(MultiMatchQuery(text, fts_columns), query_type='fts')
+    if where:
+        query = query.where(where, prefilter=True)
+    # _score must be selected explicitly; LanceDB deprecates adding it behind select()
+    query = query.select(list(columns) + ['_score'])
+    # limit(None) on an FTS query still stops at LanceDB's default of 10; "every match" is every row
+    query = query.limit(limit if limit is not None else max(1, table.count_rows()))
+    if offset:
+        query = query.offset(offset)
+    return query.to_arrow()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print('usage: feed_search_ebs.py "<query>"')
+        sys.exit(1)
+    table = lancedb.connect(DB_URI).open_table(TABLE_NAME)
+    started = time.perf_counter()
+    result = search_feed(table, ' '.join(sys.argv[1:]), ['id', 'title'], limit=20)
+    print(f"🔎 {result.num_rows} matches in {(time.perf_counter() - started) * 1000:.1f} ms")
+    for row in result.to_pylist():
+        print(f"   {row['_score']:6.2f}  {row['id']}  {row['title'][:80]}")
+
+
+if __name__ == '__main__':
+    main()
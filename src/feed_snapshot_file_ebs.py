@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Feed Snapshot File EBS - Arrow IPC file of the /api/feed list columns, shared by every web worker
+Ingest rewrites it after each commit (atomic rename); workers memory-map it, so N workers share
+one page-cache copy and format only the rows a request returns
+
+    python3 feed_snapshot_file_ebs.py write   # rewrite now (ingest does this after every run)
+    python3 feed_snapshot_file_ebs.py show
+"""
+import argparse
+import os
+from datetime import datetime, timezone
+from threading import Lock
+
+import lancedb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from feed_cache_ebs import NAT_SORT_KEY, SOURCE_TYPES
+from feed_schema_ebs import parse_created_at
+
+DB_URI = os.getenv('EBS_LANCEDB_PATH', '/mnt/lancedb_clean')
+TABLE_NAME = os.getenv('EBS_LANCEDB_TABLE', 'unified_feed')
+SNAPSHOT_FILE = os.getenv('EBS_FEED_SNAPSHOT_FILE', os.path.join(DB_URI, 'feed_snapshot_ebs.arrow'))
+
+# The list-view columns sage_ebs_clean reads (LIST_COLUMNS); ?fields=full still goes to LanceDB
+SNAPSHOT_COLUMNS = [
+    'id', 'source_type', 'source', 'created_at', 'title', 'sender_tag', 'ai_score',
+    'is_junk', 'is_attention', 'themes', 'link', 'content_text', 'custom_fields', 'sender', 'author'
+]
+# The list view never shows more of content_text than this
+CONTENT_TEXT_CHARS = 1000
+SORT_KEY_COLUMN = '_sort_key'
+VERSION_KEY = b'table_version'
+# Formatted items a snapshot keeps for the pages clients actually hit (newest first, mostly)
+FORMATTED_CACHE_ITEMS = 5000
+
+
+def write_snapshot(table, path=SNAPSHOT_FILE, log=print):
+    """Write the list columns of table, newest first, tagged with the table version they were read at"""
+    version = table.version
+    columns = [name for name in SNAPSHOT_COLUMNS if name in table.schema.names]
+    arrow = table.search().select(columns).limit(None).to_arrow()
+
+    created = arrow.column('created_at')
+    if pa.types.is_timestamp(created.type):
+        sort_keys = pc.fill_null(created.cast(pa.timestamp('ns', tz='UTC')).cast(pa.int64()), NAT_SORT_KEY)
+    else:
+        parsed = pd.DatetimeIndex(parse_created_at(created.to_pylist())).as_unit('ns')
+        sort_keys = pa.array(parsed.asi8, pa.int64())
+    arrow = arrow.append_column(SORT_KEY_COLUMN, sort_keys)
+    if 'content_text' in arrow.column_names:
+        index = arrow.schema.get_field_index('content_text')
+        arrow = arrow.set_column(index, 'content_text',
+                                 pc.utf8_slice_codeunits(arrow.column('content_text'), 0, CONTENT_TEXT_CHARS))
+    arrow = arrow.sort_by([(SORT_KEY_COLUMN, 'descending'), ('id', 'descending')])
+    arrow = arrow.replace_schema_metadata({
+        VERSION_KEY: str(version).encode('ascii'),
+        b'written_at': datetime.now(timezone.utc).isoformat().encode('ascii'),
+    })
+
+    # Uncompressed on purpose: compressed buffers would be inflated into every worker's heap
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, arrow.schema) as writer:
+            writer.write_table(arrow, max_chunksize=64 * 1024)
+    os.replace(tmp_path, path)
+    log(f"   ✅ Feed snapshot v{version}: {arrow.num_rows} rows, {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+    return version
+
+
+class MappedSnapshotFile:
+    """The memory-mapped snapshot; swapped for the new file when its inode, size or mtime changes"""
+
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        self._stat_key = None
+        self._loaded = None
+        self._lock = Lock()
+
+    def get(self):
+        """(table_version, Arrow table) of the current file, or None when there is none"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stat_key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if stat_key == self._stat_key:
+            return self._loaded
+
+        with self._lock:
+            if stat_key != self._stat_key:
+                # Readers still holding the previous table keep the old (renamed-over) mapping alive
+                arrow = pa.ipc.open_file(pa.memory_map(self.path)).read_all()
+                version = int(arrow.schema.metadata[VERSION_KEY])
+                self._loaded = (version, arrow)
+                self._stat_key = stat_key
+            return self._loaded
+
+
+class LazyItems:
+    """Feed items backed by snapshot rows; only slices that are read get formatted
+
+    Formatted items are kept by row position (shared with every take() of the same
+    snapshot), up to FORMATTED_CACHE_ITEMS, so hot pages are formatted once.
+    """
+
+    def __init__(self, arrow, positions, formatter, formatted=None):
+        # formatter(arrow_rows) -> list of item dicts
+        self._arrow = arrow
+        self._positions = positions
+        self._formatter = formatter
+        self._formatted = {} if formatted is None else formatted
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _items(self, positions):
+        if len(positions) > FORMATTED_CACHE_ITEMS:
+            # Full-list deltas are formatted for this response only
+            return self._formatter(self._arrow.take(positions))
+        missing = [int(position) for position in positions if int(position) not in self._formatted]
+        if missing and len(self._formatted) + len(missing) > FORMATTED_CACHE_ITEMS:
+            self._formatted.clear()
+            missing = [int(position) for position in positions]
+        if missing:
+            self._formatted.update(zip(missing, self._formatter(self._arrow.take(missing))))
+        return [self._formatted[int(position)] for position in positions]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._items(self._positions[key])
+        return self._items([self._positions[key]])[0]
+
+    def take(self, indices):
+        positions = self._positions[np.asarray(indices, dtype=np.int64)]
+        return LazyItems(self._arrow, positions, self._formatter, self._formatted)
+
+
+def _effective_flag(arrow, flag, overlay):
+    if flag in arrow.column_names:
+        stored = pc.fill_null(arrow.column(flag), False)
+    else:
+        stored = pa.array(np.zeros(arrow.num_rows, dtype=bool))
+    values = overlay.values[flag] if overlay is not None else {}
+    if not values:
+        return stored
+    ids = arrow.column('id')
+    marked = pa.array([item_id for item_id, value in values.items() if value], pa.string())
+    cleared = pa.array([item_id for item_id, value in values.items() if not value], pa.string())
+    return pc.if_else(pc.is_in(ids, marked), True, pc.if_else(pc.is_in(ids, cleared), False, stored))
+
+
+def mapped_feed(snapshot_file, formatter):
+    """Builder for FeedSnapshotCache: (sort_keys, ids, items) from the mapped file, or None
+    when the file is missing or was written at another table version than the one requested"""
+
+    def build(version, source_filter, view, overlay):
+        loaded = snapshot_file.get()
+        if loaded is None or loaded[0] != version:
+            return None
+        arrow = loaded[1]
+        mask = pc.equal(_effective_flag(arrow, 'is_junk', overlay), view == 'junk')
+        if source_filter in SOURCE_TYPES:
+            mask = pc.and_(mask, pc.equal(arrow.column('source_type'), source_filter))
+        positions = np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+        sort_keys = arrow.column(SORT_KEY_COLUMN).take(positions).to_numpy()
+        ids = arrow.column('id').take(positions).to_numpy(zero_copy_only=False)
+        return sort_keys, ids, LazyItems(arrow, positions, lambda rows: formatter(rows, overlay))
+
+    return build
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write or inspect the shared feed snapshot file')
+    parser.add_argument('command', choices=['write', 'show'])
+    args = parser.parse_args()
+
+    if args.command == 'write':
+        print(f"🗂️  Writing {SNAPSHOT_FILE} from {TABLE_NAME} at {DB_URI}")
+        write_snapshot(lancedb.connect(DB_URI).open_table(TABLE_NAME))
+        return
+
+    loaded = MappedSnapshotFile().get()
+    if loaded is None:
+        print(f"No snapshot at {SNAPSHOT_FILE}")
+        return
+    version, arrow = loaded
+    print(f"🗂️  {SNAPSHOT_FILE}: table version {version}, {arrow.num_rows} rows, "
+          f"written {arrow.schema.metadata.get(b'written_at', b'?').decode()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Feed Stats EBS - Materialized /api/stats counters for the unified_feed table
+Ingest adds the counts of every inserted batch; reconcile recomputes them from a column projection
+
+    python3 feed_stats_ebs.py show        # print the stored counters
+    python3 feed_stats_ebs.py reconcile   # recompute from source/source_type/ai_score/themes
+"""
+import argparse
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import lancedb
+import pandas as pd
+
+DB_URI = os.getenv('EBS_LANCEDB_PATH', '/mnt/lancedb_clean')
+TABLE_NAME = os.getenv('EBS_LANCEDB_TABLE', 'unified_feed')
+STATS_FILE = os.getenv('EBS_FEED_STATS_FILE', os.path.join(DB_URI, 'feed_stats_ebs.json'))
+
+STATS_COLUMNS = ['source', 'source_type', 'ai_score', 'themes']
+COUNTERS = ['total_items', 'email_digests', 'newsbrief_stories', 'tweets', 'with_ai_scores', 'with_keywords']
+
+
+def count_rows(df):
+    """Counter values for a DataFrame of feed rows (same definitions /api/stats always used)"""
+    def column(name):
+        return df[name] if name in df.columns else pd.Series([None] * len(df), index=df.index)
+
+    return {
+        'total_items': len(df),
+        'email_digests': int((column('source') == 'email_digest').sum()),
+        'newsbrief_stories': int((column('source') == 'newsbrief_story').sum()),
+        'tweets': int((column('source_type') == 'tweet').sum()),
+        'with_ai_scores': int(column('ai_score').notna().sum()),
+        'with_keywords': int(column('themes').notna().sum())
+    }
+
+
+@contextmanager
+def _locked(path):
+    # Ingest scripts and the reconcile job may run concurrently; serialize read-modify-write
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write(stats, path):
+    stats['updated_at'] = datetime.now().isoformat()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_stats(path=STATS_FILE):
+    """Stored counters, or None if they have never been reconciled"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def record_inserted(df, path=STATS_FILE):
+    """Add the counts for rows just passed to table.add(); no-op until a first reconcile exists"""
+    counts = count_rows(df)
+    with _locked(path):
+        stats = load_stats(path)
+        if stats is None:
+            return None
+        for name in COUNTERS:
+            stats[name] = stats.get(name, 0) + counts[name]
+        _write(stats, path)
+        return stats
+
+
+def reconcile(table, path=STATS_FILE):
+    """Recompute every counter from a projection of only the columns they need"""
+    columns = [name for name in STATS_COLUMNS if name in table.schema.names]
+    df = table.search().select(columns).limit(None).to_pandas()
+    stats = count_rows(df)
+    stats['reconciled_at'] = datetime.now().isoformat()
+    with _locked(path):
+        _write(stats, path)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain materialized unified_feed stats')
+    parser.add_argument('command', choices=['show', 'reconcile'])
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        print(json.dumps(load_stats(), indent=2))
+        return
+
+    print(f"📊 Reconciling stats for {TABLE_NAME} at {DB_URI}")
+    table = lancedb.connect(DB_URI).open_table(TABLE_NAME)
+    previous = load_stats() or {}
+    started = time.perf_counter()
+    stats = reconcile(table)
+    print(f"   ✅ Recomputed in {time.perf_counter() - started:.2f}s")
+    for name in COUNTERS:
+        drift = stats[name] - previous.get(name, 0)
+        print(f"   {name}: {stats[name]}" + (f" (drift {drift:+d})" if previous and drift else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Feed Stream EBS - Pushes newly inserted unified_feed rows to /api/stream clients
+One watcher thread per process polls the table version; every SSE client shares its events
+"""
+import json
+import time
+from collections import deque
+from threading import Condition, Thread
+
+STREAM_POLL_SECONDS = 2
+KEEPALIVE_SECONDS = 15
+EVENT_BACKLOG = 50
+
+
+class FeedWatcher:
+    """Watches the table version and publishes (version, items) events to waiting clients"""
+
+    def __init__(self, version_fn, delta_fn, poll_seconds=STREAM_POLL_SECONDS):
+        # version_fn() -> latest table version
+        # delta_fn(since_version) -> (version, formatted items added after since_version)
+        self._version_fn = version_fn
+        self._delta_fn = delta_fn
+        self._poll_seconds = poll_seconds
+        self._events = deque(maxlen=EVENT_BACKLOG)
+        self._seq = 0
+        self._version = None
+        self._cond = Condition()
+        self._thread = None
+        self._listeners = set()
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._version = self._version_fn()
+            self._thread = Thread(target=self._run, name='feed-watcher', daemon=True)
+            self._thread.start()
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def _run(self):
+        while True:
+            time.sleep(self._poll_seconds)
+            try:
+                if self._version_fn() <= self._version:
+                    continue
+                version, items = self._delta_fn(self._version)
+                self._publish(version, items)
+            except Exception as exc:
+                print(f"⚠️ Feed watcher error: {exc}", flush=True)
+
+    def add_listener(self, callback):
+        """callback() runs on the watcher thread after each new event (async clients wake their loop from it)"""
+        with self._cond:
+            self._listeners.add(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners.discard(callback)
+
+    def _publish(self, version, items):
+        with self._cond:
+            self._version = version
+            if items:
+                self._seq += 1
+                self._events.append((self._seq, version, items))
+            self._cond.notify_all()
+            listeners = list(self._listeners) if items else []
+        for callback in listeners:
+            callback()
+
+    def events_after(self, after_seq):
+        with self._cond:
+            return [event for event in self._events if event[0] > after_seq]
+
+    def wait(self, after_seq, timeout=KEEPALIVE_SECONDS):
+        """Events newer than after_seq, blocking up to timeout seconds for the first one"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._seq <= after_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [event for event in self._events if event[0] > after_seq]
+
+
+def format_sse(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def backlog_event(backlog):
+    """SSE text for a stream_backlog() result: its items, or a reset when they could not be computed"""
+    version, items = backlog
+    if items is None:
+        # The client's version was pruned; it reloads /api/feed instead of catching up
+        return format_sse({'version': version}, event='reset', event_id=version)
+    return format_sse({'version': version, 'items': items}, event='items', event_id=version)
+
+
+def stream_events(watcher, last_seq, backlog=None):
+    """SSE generator for one client; backlog is an optional stream_backlog() catch-up event
+
+    last_seq is watcher.seq read before the backlog was computed, so an event published while it
+    was being built is still sent; events the backlog already covers are skipped by version.
+    """
+    yield f"retry: {STREAM_POLL_SECONDS * 1000}\n\n"
+    sent_version = -1
+    if backlog is not None:
+        sent_version = backlog[0]
+        yield backlog_event(backlog)
+
+    while True:
+        events = watcher.wait(last_seq)
+        if not events:
+            yield ': keepalive\n\n'
+            continue
+        for seq, version, items in events:
+            last_seq = seq
+            if version <= sent_version:
+                continue
+            yield format_sse({'version': version, 'items': items}, event='items', event_id=version)
@@ -1,85 +1,55 @@
 #!/usr/bin/env python3
 """
 ID Tracker EBS - Prevent duplicate processing for EBS system
-Thread-safe JSON file tracking
+Per-id helpers over the shared dedup registry (dedup_registry_ebs.py); fetchers that check
+a whole batch should call the registry's contains_many/add_many directly.
 """
-import json
-import os
 from datetime import datetime
-from threading import Lock
 
-TRACKER_FILE = 'processed_ids_ebs.json'
-_lock = Lock()
+from dedup_registry_ebs import KINDS, REGISTRY_DB, TRACKER_FILE, DedupRegistry
+
+TRACKER_DB = REGISTRY_DB
+registry = DedupRegistry(TRACKER_DB, TRACKER_FILE)
+
 
 def load_tracker():
-    """Load processed IDs"""
-    default_tracker = {
-        "newsbrief_digests": [], 
-        "newsbrief_stories": [],
-        "tweets": [], 
-        "last_updated": datetime.now().isoformat()
-    }
-    
-    if not os.path.exists(TRACKER_FILE):
-        return default_tracker
-    
-    with _lock:
-        try:
-            with open(TRACKER_FILE, 'r') as f:
-                tracker = json.load(f)
-                # Ensure all required keys exist
-                for key in default_tracker:
-                    if key not in tracker:
-                        tracker[key] = default_tracker[key]
-                return tracker
-        except:
-            return default_tracker
+    """Processed IDs as the old JSON layout: {kind: [ids], 'last_updated': ...}"""
+    tracker = {kind: sorted(registry.ids(kind)) for kind in KINDS}
+    tracker['last_updated'] = registry.last_updated() or datetime.now().isoformat()
+    return tracker
+
 
 def save_tracker(tracker):
-    """Save processed IDs"""
-    tracker['last_updated'] = datetime.now().isoformat()
-    with _lock:
-        with open(TRACKER_FILE, 'w') as f:
-            json.dump(tracker, f, indent=2)
+    """Add every ID in a JSON-layout tracker (IDs are never removed)"""
+    for kind in KINDS:
+        registry.add_many(kind, tracker.get(kind, []))
+
 
 def is_digest_processed(digest_id):
     """Check if NewsBreif digest was already split"""
-    tracker = load_tracker()
-    return digest_id in tracker.get('newsbrief_digests', [])
+    return registry.contains('newsbrief_digests', digest_id)
+
 
 def mark_digest_processed(digest_id):
     """Mark NewsBreif digest as processed"""
-    tracker = load_tracker()
-    if digest_id not in tracker.get('newsbrief_digests', []):
-        if 'newsbrief_digests' not in tracker:
-            tracker['newsbrief_digests'] = []
-        tracker['newsbrief_digests'].append(digest_id)
-        save_tracker(tracker)
+    registry.add('newsbrief_digests', digest_id)
+
 
 def is_story_processed(story_id):
     """Check if story was already processed"""
-    tracker = load_tracker()
-    return story_id in tracker.get('newsbrief_stories', [])
+    return registry.contains('newsbrief_stories', story_id)
+
 
 def mark_story_processed(story_id):
     """Mark story as processed"""
-    tracker = load_tracker()
-    if story_id not in tracker.get('newsbrief_stories', []):
-        if 'newsbrief_stories' not in tracker:
-            tracker['newsbrief_stories'] = []
-        tracker['newsbrief_stories'].append(story_id)
-        save_tracker(tracker)
+    registry.add('newsbrief_stories', story_id)
+
 
 def is_tweet_processed(tweet_id):
     """Check if tweet was already processed"""
-    tracker = load_tracker()
-    return tweet_id in tracker.get('tweets', [])
+    return registry.contains('tweets', tweet_id)
+
 
 def mark_tweet_processed(tweet_id):
     """Mark tweet as processed"""
-    tracker = load_tracker()
-    if tweet_id not in tracker.get('tweets', []):
-        if 'tweets' not in tracker:
-            tracker['tweets'] = []
-        tracker['tweets'].append(tweet_id)
-        save_tracker(tracker)
+    registry.add('tweets', tweet_id)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Item Flags EBS - Append-only junk/attention overlay for unified_feed
+Marking an item appends one (id, flag, value, ts) row; readers apply the latest value per id and flag
+
+    python3 item_flags_ebs.py show             # print the effective flags
+    python3 item_flags_ebs.py migrate-legacy   # turn old "<id>_junk_<ts>" row copies into flags
+"""
+import argparse
+import os
+from datetime import datetime, timezone
+from threading import Lock
+
+import lancedb
+import pyarrow as pa
+
+DB_URI = os.getenv('EBS_LANCEDB_PATH', '/mnt/lancedb_clean')
+TABLE_NAME = os.getenv('EBS_LANCEDB_TABLE', 'unified_feed')
+FLAGS_TABLE = 'item_flags'
+
+FLAGS = ('is_junk', 'is_attention')
+FLAGS_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('flag', pa.string()),
+    ('value', pa.bool_()),
+    ('ts', pa.timestamp('us', tz='UTC')),
+])
+
+LEGACY_JUNK_MARKER = '_junk_'
+
+
+class FlagOverlay:
+    """Latest value per (flag, id) at one item_flags version"""
+
+    def __init__(self, version, values=None):
+        self.version = version
+        self.values = values or {flag: {} for flag in FLAGS}
+
+    def get(self, flag, item_id, default=None):
+        return self.values[flag].get(item_id, default)
+
+    def ids(self, flag):
+        """Ids whose flag is overridden, sorted so where clauses built from them are stable"""
+        return sorted(self.values[flag])
+
+
+EMPTY_OVERLAY = FlagOverlay(0)
+
+
+def _id_list(ids):
+    return ', '.join("'" + str(item_id).replace("'", "''") + "'" for item_id in ids)
+
+
+def junk_where(overlay, junk=False):
+    """LanceDB predicate on the effective junk value (stored is_junk with the overlay applied)"""
+    flagged = overlay.values['is_junk']
+    marked = [item_id for item_id, value in sorted(flagged.items()) if value == junk]
+    unmarked = [item_id for item_id, value in sorted(flagged.items()) if value != junk]
+    where = 'is_junk = true' if junk else '(is_junk IS NULL OR is_junk = false)'
+    if unmarked:
+        where = f"({where} AND id NOT IN ({_id_list(unmarked)}))"
+    if marked:
+        where = f"({where} OR id IN ({_id_list(marked)}))"
+    return where
+
+
+def open_flags(db, create=False):
+    """The item_flags table, or None when it does not exist yet and create is False"""
+    if create:
+        return db.create_table(FLAGS_TABLE, schema=FLAGS_SCHEMA, exist_ok=True)
+    try:
+        return db.open_table(FLAGS_TABLE)
+    except ValueError:
+        return None
+
+
+def set_flag(db, item_id, flag, value):
+    """Append one overlay row; O(1) regardless of the unified_feed size"""
+    if flag not in FLAGS:
+        raise ValueError(f"Unknown flag: {flag}")
+    row = pa.table({
+        'id': [str(item_id)],
+        'flag': [flag],
+        'value': [bool(value)],
+        'ts': [datetime.now(timezone.utc)],
+    }, schema=FLAGS_SCHEMA)
+    open_flags(db, create=True).add(row)
+
+
+def load_overlay(flags_table):
+    if flags_table is None:
+        return EMPTY_OVERLAY
+    version = flags_table.version
+    rows = flags_table.search().limit(None).to_arrow().sort_by([('ts', 'ascending')])
+    values = {flag: {} for flag in FLAGS}
+    for item_id, flag, value in zip(rows.column('id').to_pylist(), rows.column('flag').to_pylist(),
+                                    rows.column('value').to_pylist()):
+        if flag in values:
+            values[flag][item_id] = bool(value)
+    return FlagOverlay(version, values)
+
+
+class FlagOverlayCache:
+    """Reuses the loaded overlay until the item_flags table version moves"""
+
+    def __init__(self):
+        self._overlay = EMPTY_OVERLAY
+        self._lock = Lock()
+
+    def get(self, db):
+        return self.for_table(open_flags(db))
+
+    def for_table(self, flags_table):
+        """Overlay for an already opened item_flags handle (None when the table does not exist yet)"""
+        version = flags_table.version if flags_table is not None else 0
+        overlay = self._overlay
+        if overlay.version == version:
+            return overlay
+
+        with self._lock:
+            if self._overlay.version != version:
+                self._overlay = load_overlay(flags_table)
+            return self._overlay
+
+
+def migrate_legacy(db, log=print):
+    """Record a junk flag for every "<id>_junk_<ts>" copy and delete the copies"""
+    table = db.open_table(TABLE_NAME)
+    copies = table.search().where(f"id LIKE '%{LEGACY_JUNK_MARKER}%'").select(['id']).limit(None).to_arrow()
+    copy_ids = copies.column('id').to_pylist()
+    original_ids = sorted({item_id.rsplit(LEGACY_JUNK_MARKER, 1)[0] for item_id in copy_ids})
+    if not original_ids:
+        log('   ✅ No legacy junk copies found')
+        return 0
+
+    now = datetime.now(timezone.utc)
+    open_flags(db, create=True).add(pa.table({
+        'id': original_ids,
+        'flag': ['is_junk'] * len(original_ids),
+        'value': [True] * len(original_ids),
+        'ts': [now] * len(original_ids),
+    }, schema=FLAGS_SCHEMA))
+    table.delete(f"id LIKE '%{LEGACY_JUNK_MARKER}%'")
+    log(f"   ✅ {len(original_ids)} items flagged as junk, {len(copy_ids)} row copies removed")
+    log('   ℹ️  Run "python3 feed_stats_ebs.py reconcile" to update /api/stats')
+    return len(original_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or migrate the item_flags overlay')
+    parser.add_argument('command', choices=['show', 'migrate-legacy'])
+    args = parser.parse_args()
+
+    db = lancedb.connect(DB_URI)
+    if args.command == 'migrate-legacy':
+        print(f"🏷️  Migrating legacy junk copies in {TABLE_NAME} at {DB_URI}")
+        migrate_legacy(db)
+        return
+
+    overlay = load_overlay(open_flags(db))
+    print(f"🏷️  item_flags version {overlay.version}")
+    for flag in FLAGS:
+        set_ids = [item_id for item_id, value in overlay.values[flag].items() if value]
+        print(f"   {flag}: {len(set_ids)} set, {len(overlay.values[flag]) - len(set_ids)} cleared")
+
+
+if __name__ == '__main__':
+    main()
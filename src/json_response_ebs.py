@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+JSON Response EBS - Streamed, compressed JSON bodies for the large API payloads
+Items are serialized one at a time (orjson when installed) and pushed through gzip or brotli
+as they are produced, so no request holds the whole JSON string in memory
+"""
+import json
+import zlib
+from datetime import date, datetime
+
+import numpy as np
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CHUNK_BYTES = 64 * 1024
+GZIP_LEVEL = 6
+# Quality 5 keeps brotli faster than gzip -6 on text while still compressing better
+BROTLI_QUALITY = 5
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    """JSON bytes for value; NaN/inf become null with orjson"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def negotiate_encoding(request):
+    """'br', 'gzip' or None, by the client's Accept-Encoding preferences"""
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def iter_json(payload, stream_key='items'):
+    """payload as JSON pieces: payload[stream_key] first, one item per piece, then the other keys"""
+    rest = {key: value for key, value in payload.items() if key != stream_key}
+    yield b'{' + dumps(stream_key) + b':['
+    for position, item in enumerate(payload.get(stream_key) or []):
+        yield b',' + dumps(item) if position else dumps(item)
+    tail = dumps(rest)
+    yield b'],' + tail[1:] if len(tail) > 2 else b']}'
+
+
+def _chunked(pieces, size=CHUNK_BYTES):
+    buffer = bytearray()
+    for piece in pieces:
+        buffer += piece
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _compressed(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def json_response(payload, encoding=None, stream_key='items', status=200):
+    """Streamed (chunked) JSON response, compressed with encoding when given"""
+    body = _chunked(iter_json(payload, stream_key))
+    if encoding:
+        body = _compressed(body, encoding)
+    response = Response(body, status=status, mimetype='application/json', direct_passthrough=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Keyword Index EBS - Inverted index from normalized keyword to unified_feed items
+One keyword_postings row per (keyword, item); ingest appends postings for every inserted batch
+
+    python3 keyword_index_ebs.py rebuild          # backfill from unified_feed themes
+    python3 keyword_index_ebs.py top --days 7     # most frequent keywords
+"""
+import argparse
+import os
+import time
+from datetime import timedelta
+
+import lancedb
+import pandas as pd
+import pyarrow as pa
+
+from feed_indexes_ebs import create_scalar_index
+from feed_schema_ebs import CREATED_AT_TYPE, normalize_keyword, parse_created_at, split_keywords, time_range_where
+
+DB_URI = os.getenv('EBS_LANCEDB_PATH', '/mnt/lancedb_clean')
+TABLE_NAME = os.getenv('EBS_LANCEDB_TABLE', 'unified_feed')
+POSTINGS_TABLE = 'keyword_postings'
+
+POSTINGS_SCHEMA = pa.schema([
+    ('keyword', pa.string()),
+    ('label', pa.string()),
+    ('item_id', pa.string()),
+    ('source_type', pa.string()),
+    ('created_at', CREATED_AT_TYPE),
+])
+POSTINGS_INDEXES = [
+    ('keyword', 'BTREE'),
+    ('created_at', 'BTREE'),
+]
+
+BATCH_ROWS = 10000
+
+
+def _keyword_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return split_keywords(value) or []
+    return [str(keyword) for keyword in value]
+
+
+def postings_for_rows(rows):
+    """Posting dicts for feed rows (dicts with id, themes, created_at, source_type)"""
+    rows = list(rows)
+    created = parse_created_at([row.get('created_at') for row in rows])
+    postings = []
+    for row, created_at in zip(rows, created):
+        seen = set()
+        for label in _keyword_list(row.get('themes')):
+            keyword = normalize_keyword(label)
+            if not keyword or keyword in seen:
+                continue
+            seen.add(keyword)
+            postings.append({
+                'keyword': keyword,
+                'label': label.strip(),
+                'item_id': str(row.get('id', '')),
+                'source_type': row.get('source_type'),
+                'created_at': None if pd.isna(created_at) else created_at.to_pydatetime(),
+            })
+    return postings
+
+
+def open_postings(db, create=False):
+    if create:
+        return db.create_table(POSTINGS_TABLE, schema=POSTINGS_SCHEMA, exist_ok=True)
+    try:
+        return db.open_table(POSTINGS_TABLE)
+    except ValueError:
+        return None
+
+
+def add_item_keywords(db, rows):
+    """Append postings for newly inserted feed rows; returns the number of postings written"""
+    postings = postings_for_rows(rows)
+    if postings:
+        open_postings(db, create=True).add(pa.Table.from_pylist(postings, schema=POSTINGS_SCHEMA))
+    return len(postings)
+
+
+def refresh_postings(db, log=print):
+    """Fold appended postings into the keyword index (run once per ingest run)"""
+    postings = open_postings(db)
+    if postings is None:
+        return
+    if not postings.list_indices():
+        _build_postings_indexes(postings)
+    else:
+        postings.optimize()
+    log('   ✅ Keyword index refreshed')
+
+
+def _build_postings_indexes(postings):
+    for column, index_type in POSTINGS_INDEXES:
+        create_scalar_index(postings, column, index_type)
+
+
+def rebuild(db, log=print):
+    table = db.open_table(TABLE_NAME)
+    columns = [name for name in ('id', 'themes', 'created_at', 'source_type') if name in table.schema.names]
+    started = time.perf_counter()
+
+    def batches():
+        for batch in table.search().select(columns).limit(None).to_batches(BATCH_ROWS):
+            postings = postings_for_rows(batch.to_pylist())
+            if postings:
+                yield from pa.Table.from_pylist(postings, schema=POSTINGS_SCHEMA).to_batches()
+
+    postings = db.create_table(POSTINGS_TABLE, data=pa.RecordBatchReader.from_batches(POSTINGS_SCHEMA, batches()),
+                               mode='overwrite')
+    _build_postings_indexes(postings)
+    log(f"   ✅ {postings.count_rows()} postings rebuilt in {time.perf_counter() - started:.1f}s")
+    return postings
+
+
+def _where(*clauses):
+    return ' AND '.join(clause for clause in clauses if clause) or None
+
+
+def _quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def keyword_item_ids(postings, keyword, start=None, end=None):
+    """Ids of items tagged with keyword (normalized match); None when the index has not been built"""
+    if postings is None:
+        return None
+    where = _where(f"keyword = {_quote(normalize_keyword(keyword))}", time_range_where(postings, start, end))
+    result = postings.search().where(where).select(['item_id']).limit(None).to_arrow()
+    return set(result.column('item_id').to_pylist())
+
+
+def keyword_facets(postings, prefix='', start=None, end=None, limit=20):
+    """Keywords starting with prefix and their item counts, overall and per source_type"""
+    if postings is None:
+        return None
+    prefix = normalize_keyword(prefix)
+    prefix_clause = None
+    if prefix:
+        escaped = prefix.replace("'", "''").replace('%', '').replace('_', '')
+        prefix_clause = f"keyword LIKE '{escaped}%'"
+    query = postings.search()
+    where = _where(prefix_clause, time_range_where(postings, start, end))
+    if where:
+        query = query.where(where)
+    df = query.select(['keyword', 'label', 'source_type', 'created_at']).limit(None).to_pandas()
+    if df.empty:
+        return []
+
+    grouped = df.groupby('keyword')
+    facets = pd.DataFrame({
+        'count': grouped.size(),
+        'label': grouped['label'].agg(lambda labels: labels.value_counts().index[0]),
+        'last_seen': grouped['created_at'].max(),
+    })
+    by_source = df.pivot_table(index='keyword', columns='source_type', values='label', aggfunc='size', fill_value=0)
+    facets = facets.sort_values(['count', 'last_seen'], ascending=False).head(limit)
+
+    results = []
+    for keyword, facet in facets.iterrows():
+        results.append({
+            'keyword': keyword,
+            'label': facet['label'],
+            'count': int(facet['count']),
+            'by_source': {str(source): int(count) for source, count in by_source.loc[keyword].items() if count},
+            'last_seen': facet['last_seen'].isoformat().replace('+00:00', 'Z') if pd.notna(facet['last_seen']) else None
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the keyword_postings inverted index')
+    parser.add_argument('command', choices=['rebuild', 'top'])
+    parser.add_argument('--days', type=int, default=7, help='top: look-back window')
+    parser.add_argument('--limit', type=int, default=30, help='top: keywords to print')
+    args = parser.parse_args()
+
+    db = lancedb.connect(DB_URI)
+    if args.command == 'rebuild':
+        print(f"🔑 Rebuilding {POSTINGS_TABLE} from {TABLE_NAME} at {DB_URI}")
+        rebuild(db)
+        return
+
+    start = pd.Timestamp.now(tz='UTC') - timedelta(days=args.days)
+    for facet in keyword_facets(open_postings(db), start=start, limit=args.limit) or []:
+        print(f"   {facet['count']:>6}  {facet['label']}")
+
+
+if __name__ == '__main__':
+    main()
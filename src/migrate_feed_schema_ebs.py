@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Migrate Feed Schema EBS - One-time rewrites of unified_feed column types
+
+    python3 migrate_feed_schema_ebs.py timestamps --dry-run   # report what would change
+    python3 migrate_feed_schema_ebs.py timestamps             # created_at string -> timestamp[us, UTC]
+    python3 migrate_feed_schema_ebs.py nested                 # themes/actors -> list<string>, custom_fields -> struct
+
+Every step copies the table directory to a backup first and streams the rewrite from that copy,
+so memory stays bounded and the backup doubles as the restore point.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import lancedb
+import pyarrow as pa
+
+from feed_indexes_ebs import build_indexes
+from feed_schema_ebs import (
+    CREATED_AT_TYPE, CUSTOM_FIELDS_TYPE, KEYWORD_COLUMNS, KEYWORDS_TYPE, TZ_SUFFIX,
+    created_at_is_typed, custom_fields_value, nested_columns_enabled, parse_created_at, split_keywords
+)
+
+DB_URI = os.getenv('EBS_LANCEDB_PATH', '/mnt/lancedb_clean')
+TABLE_NAME = os.getenv('EBS_LANCEDB_TABLE', 'unified_feed')
+BACKUP_ROOT = os.getenv('EBS_LANCEDB_BACKUP_ROOT', DB_URI.rstrip('/') + '_backups')
+
+BATCH_ROWS = 10000
+
+
+def _convert_created_at(batch):
+    index = batch.schema.get_field_index('created_at')
+    parsed = parse_created_at(batch.column(index).to_pylist())
+    column = pa.array(parsed.dt.tz_convert('UTC'), type=CREATED_AT_TYPE, from_pandas=True)
+    return batch.set_column(index, pa.field('created_at', CREATED_AT_TYPE), column)
+
+
+def _backup_table(step, log):
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_dir = os.path.join(BACKUP_ROOT, f"{step}_{stamp}")
+    started = time.perf_counter()
+    shutil.copytree(os.path.join(DB_URI, f"{TABLE_NAME}.lance"),
+                    os.path.join(backup_dir, f"{TABLE_NAME}.lance"))
+    log(f"   💾 Backup at {backup_dir} ({time.perf_counter() - started:.1f}s)")
+    return backup_dir
+
+
+def _rewrite(db, backup_dir, convert, schema, log):
+    """Overwrite TABLE_NAME with convert(batch) for every batch of the backup copy"""
+    source = lancedb.connect(backup_dir).open_table(TABLE_NAME)
+    total = source.count_rows()
+
+    def batches():
+        done = 0
+        for batch in source.search().limit(None).to_batches(BATCH_ROWS):
+            done += batch.num_rows
+            log(f"   … {done}/{total} rows")
+            yield convert(batch)
+
+    started = time.perf_counter()
+    table = db.create_table(TABLE_NAME, data=pa.RecordBatchReader.from_batches(schema, batches()),
+                            mode='overwrite')
+    log(f"   ✅ Rewrote {table.count_rows()} rows in {time.perf_counter() - started:.1f}s")
+    # Overwriting starts a fresh dataset, so the scalar indexes have to be rebuilt
+    build_indexes(table, replace=True, log=log)
+    return table
+
+
+def migrate_timestamps(db, dry_run=False, log=print):
+    table = db.open_table(TABLE_NAME)
+    if created_at_is_typed(table):
+        log('   ✅ created_at is already a timestamp column')
+        return table
+
+    values = table.search().select(['created_at']).limit(None).to_pandas()['created_at']
+    parsed = parse_created_at(values)
+    text = values.fillna('').astype(str).str.strip()
+    blank = text == ''
+    failed = text[parsed.isna() & ~blank].tolist()
+    naive = int((~blank & ~text.str.contains(TZ_SUFFIX, regex=True) & parsed.notna()).sum())
+    log(f"   rows={len(values)} blank={int(blank.sum())} naive(read as UTC)={naive} unparseable={len(failed)}")
+    for value in failed[:10]:
+        log(f"      ⚠️  {value!r} -> null")
+    if dry_run:
+        return table
+
+    backup_dir = _backup_table('timestamps', log)
+    schema = table.schema.set(table.schema.get_field_index('created_at'), pa.field('created_at', CREATED_AT_TYPE))
+    return _rewrite(db, backup_dir, _convert_created_at, schema, log)
+
+
+def _parse_custom_fields(value):
+    if value is None or not str(value).strip():
+        return None
+    try:
+        fields = json.loads(value)
+    except ValueError:
+        fields = None
+    if not isinstance(fields, dict):
+        # Kept verbatim rather than dropped
+        return custom_fields_value({'raw': value}, True)
+    return custom_fields_value(fields, True)
+
+
+def _nested_schema(schema):
+    for name in KEYWORD_COLUMNS:
+        if name in schema.names:
+            schema = schema.set(schema.get_field_index(name), pa.field(name, KEYWORDS_TYPE))
+    if 'custom_fields' in schema.names:
+        schema = schema.set(schema.get_field_index('custom_fields'), pa.field('custom_fields', CUSTOM_FIELDS_TYPE))
+    return schema
+
+
+def _convert_nested(batch):
+    for name in KEYWORD_COLUMNS:
+        if name in batch.schema.names:
+            index = batch.schema.get_field_index(name)
+            values = [split_keywords(value) for value in batch.column(index).to_pylist()]
+            batch = batch.set_column(index, pa.field(name, KEYWORDS_TYPE), pa.array(values, type=KEYWORDS_TYPE))
+    if 'custom_fields' in batch.schema.names:
+        index = batch.schema.get_field_index('custom_fields')
+        values = [_parse_custom_fields(value) for value in batch.column(index).to_pylist()]
+        batch = batch.set_column(index, pa.field('custom_fields', CUSTOM_FIELDS_TYPE),
+                                 pa.array(values, type=CUSTOM_FIELDS_TYPE))
+    return batch
+
+
+def migrate_nested(db, dry_run=False, log=print):
+    table = db.open_table(TABLE_NAME)
+    if nested_columns_enabled(table):
+        log('   ✅ themes/actors/custom_fields are already nested columns')
+        return table
+
+    sample = table.search().select([name for name in ('themes', 'custom_fields') if name in table.schema.names])
+    sample = sample.limit(None).to_arrow()
+    if 'custom_fields' in sample.column_names:
+        unparsed = 0
+        for value in sample.column('custom_fields').to_pylist():
+            converted = _parse_custom_fields(value)
+            if converted is not None and converted['extra'] and 'raw' in json.loads(converted['extra']):
+                unparsed += 1
+        log(f"   custom_fields: rows={sample.num_rows} not-a-JSON-object={unparsed} (kept in extra.raw)")
+    if 'themes' in sample.column_names:
+        keywords = [split_keywords(value) for value in sample.column('themes').to_pylist()]
+        log(f"   themes: with keywords={sum(1 for value in keywords if value)} "
+            f"distinct={len({keyword for value in keywords if value for keyword in value})}")
+    if dry_run:
+        return table
+
+    backup_dir = _backup_table('nested', log)
+    return _rewrite(db, backup_dir, _convert_nested, _nested_schema(table.schema), log)
+
+
+STEPS = {
+    'timestamps': migrate_timestamps,
+    'nested': migrate_nested,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='One-time unified_feed schema migrations')
+    parser.add_argument('step', choices=sorted(STEPS))
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+    args = parser.parse_args()
+
+    print(f"🛠️  {args.step} migration on {TABLE_NAME} at {DB_URI}")
+    db = lancedb.connect(DB_URI)
+    try:
+        STEPS[args.step](db, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,7 +17,16 @@ import lancedb
 import pandas as pd
 from bs4 import BeautifulSoup
 
-from id_tracker_ebs import is_digest_processed, mark_digest_processed
+from dedup_registry_ebs import DedupRegistry
+from feed_indexes_ebs import existing_ids as existing_ids_in_table, refresh_indexes
+from feed_schema_ebs import (
+    created_at_is_typed, created_at_value, custom_fields_value, feed_rows_to_arrow, keywords_value,
+    nested_columns_enabled
+)
+from feed_snapshot_file_ebs import write_snapshot
+from feed_stats_ebs import record_inserted
+from keyword_index_ebs import add_item_keywords, refresh_postings
+from rag_query_engine_ebs import RAGQueryEngine
 
 import sys
 sys.path.insert(0, '/home/ubuntu/newspaper_project/handlers')
@@ -36,6 +45,12 @@ if not ANTHROPIC_KEY:
 FETCH_WINDOW_DAYS = 7
 MAX_DIGESTS = 20
 DELAY_SECONDS = 1
+MIN_BODY_CHARS = 4000
+# Headers and sizes are fetched for this many messages per IMAP command
+HEADER_FETCH_CHUNK = 500
+HEADER_FIELDS = 'BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE MESSAGE-ID)]'
+_FETCH_SEQ = re.compile(rb'^(\d+) \(')
+_FETCH_SIZE = re.compile(rb'RFC822\.SIZE (\d+)')
 
 ALLOWLIST = [
     'Bloomberg',
@@ -79,14 +94,6 @@ def parse_email_datetime(date_header: str) -> datetime:
         return datetime.utcnow().replace(tzinfo=timezone.utc)
 
 
-def format_created_at(date_header: str) -> str:
-    dt = parse_email_datetime(date_header)
-    iso = dt.isoformat()
-    if iso.endswith('+00:00'):
-        iso = iso[:-6] + 'Z'
-    return iso
-
-
 def decode_str(value: str) -> str:
     if not value:
         return ''
@@ -105,344 +112,37 @@ def sender_allowed(sender_name: str) -> bool:
     return any(tag.lower() in lower for tag in ALLOWLIST)
 
 
-def connect_db():
-    db = lancedb.connect(DB_URI)
-    return db.open_table(TABLE_NAME)
-
+def sender_name_of(msg) -> str:
+    sender_raw = decode_str(msg.get('From', ''))
+    return sender_raw.split('<')[0].strip().strip('"')
 
-def fetch_candidates():
-    log('📥 Connecting to Gmail…')
-    imap = imaplib.IMAP4_SSL('imap.gmail.com')
-    imap.login(GMAIL_USER, GMAIL_PASSWORD)
-    imap.select('INBOX')
 
-    since_date = (datetime.now() - timedelta(days=FETCH_WINDOW_DAYS)).strftime('%d-%b-%Y')
-    status, data = imap.search(None, f'(SINCE {since_date})')
-    if status != 'OK':
-        log('❌ Gmail search failed')
-        imap.logout()
-        return []
+def digest_id_of(msg, eid: bytes) -> str:
+    return msg.get('Message-ID') or f"digest-{eid.decode()}"
 
-    email_ids = data[0].split()
-    log(f"   📧 {len(email_ids)} emails found in window")
 
-    digests = []
-    for eid in reversed(email_ids):
-        if len(digests) >= MAX_DIGESTS:
-            break
-
-        status, msg_data = imap.fetch(eid, '(RFC822)')
+def fetch_headers(imap, email_ids):
+    """{eid: [RFC822.SIZE, header-only Message]} from batched FETCHes; PEEK leaves messages unread"""
+    headers = {}
+    for start in range(0, len(email_ids), HEADER_FETCH_CHUNK):
+        chunk = email_ids[start:start + HEADER_FETCH_CHUNK]
+        status, data = imap.fetch(b','.join(chunk).decode(), f'(RFC822.SIZE {HEADER_FIELDS})')
         if status != 'OK':
             continue
-
-        msg = email.message_from_bytes(msg_data[0][1])
-        sender_raw = decode_str(msg.get('From', ''))
-        sender_name = sender_raw.split('<')[0].strip().strip('"')
-        if not sender_allowed(sender_name):
-            continue
-
-        subject = decode_str(msg.get('Subject', ''))
-
-        body_text = ''
-        body_html = ''
-        if msg.is_multipart():
-            for part in msg.walk():
-                try:
-                    payload = part.get_payload(decode=True)
-                    if not payload:
-                        continue
-                    text = payload.decode('utf-8', errors='ignore')
-                except Exception:
-                    continue
-
-                if part.get_content_type() == 'text/plain' and not body_text:
-                    body_text = text
-                elif part.get_content_type() == 'text/html' and not body_html:
-                    body_html = text
-        else:
-            payload = msg.get_payload(decode=True) or b''
-            text = payload.decode('utf-8', errors='ignore')
-            if msg.get_content_type() == 'text/html':
-                body_html = text
-            else:
-                body_text = text
-
-        combined = body_html or body_text
-        if len(combined) < 4000:
-            continue
-
-        message_id = msg.get('Message-ID') or f"digest-{eid.decode()}"
-        date_header = msg.get('Date')
-        created_at_iso = format_created_at(date_header)
-
-        digests.append({
-            'id': message_id,
-            'sender': sender_name,
-            'subject': subject,
-            'content_text': body_text or BeautifulSoup(body_html, 'html.parser').get_text(separator='\n'),
-            'content_html': body_html,
-            'created_at': created_at_iso
-        })
-
-    imap.logout()
-    log(f"   ✅ {len(digests)} NewsBrief candidates")
-    return digests
-
-
-def parse_story_blocks(html: str):
-    pattern = r'<strong[^>]*>(\d+)\.\s([^<]+)</strong>(.*?)(?=<strong|$)'
-    matches = re.findall(pattern, html, re.DOTALL)
-    stories = []
-    for number, title, block in matches:
-        block = block.strip()
-        soup = BeautifulSoup(block, 'html.parser')
-        text = soup.get_text(separator='\n').strip()
-        link_match = re.search(r'href="([^"]+)"', block)
-        link = link_match.group(1) if link_match else ''
-        stories.append({
-            'number': int(number),
-            'title': title.strip(),
-            'html': block,
-            'text': text,
-            'link': link
-        })
-    return stories
-
-
-def extract_keywords(text: str):
-    try:
-        result = extract_tweet_keywords(text[:500], ANTHROPIC_KEY, KEYWORD_EXCLUSIONS)
-        keywords = result.get('keywords') or []
-        score = float(result.get('score', 8.0))
-        return ' • '.join(keywords), score
-    except Exception as exc:
-        log(f"   ⚠️ Keyword extraction failed: {exc}")
-        return '', 7.0
-
-
-def build_story_records(digest, stories):
-    records = []
-    for story in stories:
-        keywords, score = extract_keywords(story['text'])
-        records.append({
-            'id': f"{digest['id']}_story_{story['number']}",
-            'source_type': 'email',
-            'source': 'newsbrief_story',
-            'created_at': digest['created_at'],
-            'author': digest['sender'],
-            'sender': f"{digest['sender']} - Newsbrief",
-            'sender_tag': f"{digest['sender']} - Newsbrief",
-            'title': f"{story['number']}. {story['title']}",
-            'subject': f"{digest['subject']} - Story {story['number']}",
-            'content_text': story['text'],
-            'content_html': story['html'],
-            'enriched_content': story['html'],
-            'themes': keywords,
-            'actors': None,
-            'ai_score': score,
-            'sentiment': None,
-            'category': 'news',
-            'market_impact': None,
-            'link': story['link'],
-            'parent_id': digest['id'],
-            'story_number': story['number'],
-            'is_junk': False,
-            'custom_fields': json.dumps({'digest_subject': digest['subject']})
-        })
-    return records
-
-
-def main():
-    log('=' * 80)
-    log('🚀 NewsBrief Batch Processor (EBS INSERT-only)')
-    log('=' * 80)
-    log(datetime.now().strftime('🕒 %Y-%m-%d %H:%M:%S'))
-
-    table = connect_db()
-    digests = fetch_candidates()
-    if not digests:
-        log('✅ No digests found')
-        return
-
-    total_stories = 0
-    for digest in digests:
-        if is_digest_processed(digest['id']):
-            log(f"⏭️  Already processed: {digest['subject'][:60]}")
-            continue
-
-        log(f"📰 {digest['sender']} — {digest['subject'][:60]}")
-        response = enrich_newsbrief_with_links(
-            digest['subject'],
-            digest['content_text'],
-            digest['sender'],
-            ANTHROPIC_KEY
-        )
-
-        summary_html = response.get('smart_summary', '')
-        if not summary_html:
-            log('   ❌ Handler returned empty summary')
-            continue
-
-        stories = parse_story_blocks(summary_html)
-        if not stories:
-            log('   ❌ No stories parsed from summary')
-            continue
-
-        story_records = build_story_records(digest, stories)
-        # Check for existing stories before inserting
-
-        existing_df = table.to_pandas()
-
-        existing_ids = set(existing_df['id'].unique())
-
-        
-
-        # Filter out stories that already exist
-
-        new_story_records = []
-
-        for story in story_records:
-
-            if story['id'] not in existing_ids:
-
-                new_story_records.append(story)
-
-        
-
-        if new_story_records:
-
-            table.add(pd.DataFrame(new_story_records))
-
-            log(f"   ✅ Added {len(new_story_records)} new stories ({len(story_records) - len(new_story_records)} duplicates skipped)")
-
-        else:
-
-            log(f"   ℹ️ All {len(story_records)} stories already exist, skipping")
-
-        
-
-        # Original line (now replaced):
-
-        # table.add(pd.DataFrame(story_records))
-        mark_digest_processed(digest['id'])
-        total_stories += len(story_records)
-        time.sleep(DELAY_SECONDS)
-
-    log('=' * 80)
-    log(f"✅ Completed. Stories added: {total_stories}")
-    log('=' * 80)
-
-
-if __name__ == '__main__':
-    main()
-#!/usr/bin/env python3
-"""
-NewsBrief Batch Processor for EBS (INSERT-only)
-Replicates the 8540 cron behavior without UPDATE operations.
-"""
-
-import imaplib
-import email
-from email.header import decode_header
-from email.utils import parsedate_to_datetime
-import os
-import re
-import json
-import time
-from datetime import datetime, timedelta, timezone
-from threading import Lock
-
-import lancedb
-import pandas as pd
-from bs4 import BeautifulSoup
-
-from id_tracker_ebs import is_digest_processed, mark_digest_processed
-
-import sys
-sys.path.insert(0, '/home/ubuntu/newspaper_project/handlers')
-from newsbrief_with_links_handler import enrich_newsbrief_with_links
-from tweet_keyword_handler import extract_tweet_keywords
-
-
-GMAIL_USER = os.getenv('GMAIL_USER', 'prjfiles@gmail.com')
-GMAIL_PASSWORD = os.getenv('GMAIL_APP_PASSWORD', 'kwgfutaxitoesvlz')
-DB_URI = '/mnt/lancedb_clean'
-TABLE_NAME = 'unified_feed'
-ANTHROPIC_KEY = os.getenv(
-    'ANTHROPIC_API_KEY',
-    ''YOUR_ANTHROPIC_API_KEY_HERE''
-)
-
-FETCH_WINDOW_DAYS = 7
-MAX_DIGESTS = 20
-DELAY_SECONDS = 1
-
-ALLOWLIST = [
-    'Bloomberg',
-    'WSJ',
-    'Reuters',
-    "Barron's",
-    'Estadão',
-    'Folha',
-    'Business Insider',
-    'Financial Times',
-    'Topdown Charts',
-    'Globo'
-]
-
-EXCLUSIONS_PATH = '/home/ubuntu/newspaper_project/keyword_exclusions.json'
-if os.path.exists(EXCLUSIONS_PATH):
-    with open(EXCLUSIONS_PATH, 'r') as f:
-        KEYWORD_EXCLUSIONS = json.load(f)
-else:
-    KEYWORD_EXCLUSIONS = []
-
-_print_lock = Lock()
-
-
-def log(message: str) -> None:
-    with _print_lock:
-        print(message, flush=True)
-
-
-def parse_email_datetime(date_header: str) -> datetime:
-    if not date_header:
-        return datetime.utcnow().replace(tzinfo=timezone.utc)
-    try:
-        dt = parsedate_to_datetime(date_header)
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        else:
-            dt = dt.astimezone(timezone.utc)
-        return dt
-    except Exception:
-        return datetime.utcnow().replace(tzinfo=timezone.utc)
-
-
-def format_created_at(date_header: str) -> str:
-    dt = parse_email_datetime(date_header)
-    iso = dt.isoformat()
-    if iso.endswith('+00:00'):
-        iso = iso[:-6] + 'Z'
-    return iso
-
-
-def decode_str(value: str) -> str:
-    if not value:
-        return ''
-    pieces = decode_header(value)
-    text = ''
-    for chunk, enc in pieces:
-        if isinstance(chunk, bytes):
-            text += chunk.decode(enc or 'utf-8', errors='ignore')
-        else:
-            text += chunk
-    return text
-
-
-def sender_allowed(sender_name: str) -> bool:
-    lower = sender_name.lower()
-    return any(tag.lower() in lower for tag in ALLOWLIST)
+        eid = None
+        for part in data:
+            if isinstance(part, tuple):
+                match = _FETCH_SEQ.match(part[0])
+                eid = match.group(1) if match else None
+                if eid is not None:
+                    size = _FETCH_SIZE.search(part[0])
+                    headers[eid] = [int(size.group(1)) if size else None, email.message_from_bytes(part[1])]
+            elif isinstance(part, bytes) and eid in headers and headers[eid][0] is None:
+                # Servers may send RFC822.SIZE after the header literal
+                size = _FETCH_SIZE.search(part)
+                if size:
+                    headers[eid][0] = int(size.group(1))
+    return headers
 
 
 def connect_db():
@@ -450,7 +150,7 @@ def connect_db():
     return db.open_table(TABLE_NAME)
 
 
-def fetch_candidates():
+def fetch_candidates(registry):
     log('📥 Connecting to Gmail…')
     imap = imaplib.IMAP4_SSL('imap.gmail.com')
     imap.login(GMAIL_USER, GMAIL_PASSWORD)
@@ -466,18 +166,41 @@ def fetch_candidates():
     email_ids = data[0].split()
     log(f"   📧 {len(email_ids)} emails found in window")
 
+    # Phase 1: sender, size and Message-ID of every message in the window, a few commands in all
+    headers = fetch_headers(imap, email_ids)
+    processed = registry.contains_many('newsbrief_digests', [
+        digest_id_of(header, eid) for eid, (_, header) in headers.items()
+    ])
+
+    # Phase 2: full RFC822 only for allowlisted, large enough, unprocessed messages (and any
+    # whose headers did not come back, which get the same checks after download)
     digests = []
+    skipped = {'sender': 0, 'size': 0, 'processed': 0}
+    downloaded_bytes = 0
     for eid in reversed(email_ids):
         if len(digests) >= MAX_DIGESTS:
             break
 
+        if eid in headers:
+            size, header = headers[eid]
+            if not sender_allowed(sender_name_of(header)):
+                skipped['sender'] += 1
+                continue
+            # The decoded body is never longer than the raw message
+            if size is not None and size < MIN_BODY_CHARS:
+                skipped['size'] += 1
+                continue
+            if digest_id_of(header, eid) in processed:
+                skipped['processed'] += 1
+                continue
+
         status, msg_data = imap.fetch(eid, '(RFC822)')
         if status != 'OK':
             continue
 
+        downloaded_bytes += len(msg_data[0][1])
         msg = email.message_from_bytes(msg_data[0][1])
-        sender_raw = decode_str(msg.get('From', ''))
-        sender_name = sender_raw.split('<')[0].strip().strip('"')
+        sender_name = sender_name_of(msg)
         if not sender_allowed(sender_name):
             continue
 
@@ -508,24 +231,24 @@ def fetch_candidates():
                 body_text = text
 
         combined = body_html or body_text
-        if len(combined) < 4000:
+        if len(combined) < MIN_BODY_CHARS:
             continue
 
-        message_id = msg.get('Message-ID') or f"digest-{eid.decode()}"
         date_header = msg.get('Date')
-        created_at_iso = format_created_at(date_header)
 
         digests.append({
-            'id': message_id,
+            'id': digest_id_of(msg, eid),
             'sender': sender_name,
             'subject': subject,
             'content_text': body_text or BeautifulSoup(body_html, 'html.parser').get_text(separator='\n'),
             'content_html': body_html,
-            'created_at': created_at_iso
+            'created_at': parse_email_datetime(date_header)
         })
 
     imap.logout()
-    log(f"   ✅ {len(digests)} NewsBrief candidates")
+    log(f"   ⏭️  Skipped before download: {skipped['sender']} other senders, {skipped['size']} under "
+        f"{MIN_BODY_CHARS} bytes, {skipped['processed']} already processed")
+    log(f"   ✅ {len(digests)} NewsBrief candidates ({downloaded_bytes / 1024:.0f} KB downloaded)")
     return digests
 
 
@@ -554,13 +277,13 @@ def extract_keywords(text: str):
         result = extract_tweet_keywords(text[:500], ANTHROPIC_KEY, KEYWORD_EXCLUSIONS)
         keywords = result.get('keywords') or []
         score = float(result.get('score', 8.0))
-        return ' • '.join(keywords), score
+        return keywords, score
     except Exception as exc:
         log(f"   ⚠️ Keyword extraction failed: {exc}")
-        return '', 7.0
+        return [], 7.0
 
 
-def build_story_records(digest, stories):
+def build_story_records(digest, stories, typed_created_at=False, nested=False):
     records = []
     for story in stories:
         keywords, score = extract_keywords(story['text'])
@@ -568,7 +291,7 @@ def build_story_records(digest, stories):
             'id': f"{digest['id']}_story_{story['number']}",
             'source_type': 'email',
             'source': 'newsbrief_story',
-            'created_at': digest['created_at'],
+            'created_at': created_at_value(digest['created_at'], typed_created_at),
             'author': digest['sender'],
             'sender': f"{digest['sender']} - Newsbrief",
             'sender_tag': f"{digest['sender']} - Newsbrief",
@@ -577,17 +300,17 @@ def build_story_records(digest, stories):
             'content_text': story['text'],
             'content_html': story['html'],
             'enriched_content': story['html'],
-            'themes': keywords,
-            'actors': '',
+            'themes': keywords_value(keywords, nested),
+            'actors': None,
             'ai_score': score,
-            'sentiment': '',
+            'sentiment': None,
             'category': 'news',
-            'market_impact': '',
+            'market_impact': None,
             'link': story['link'],
             'parent_id': digest['id'],
             'story_number': story['number'],
             'is_junk': False,
-            'custom_fields': json.dumps({'digest_subject': digest['subject']})
+            'custom_fields': custom_fields_value({'digest_subject': digest['subject']}, nested)
         })
     return records
 
@@ -599,14 +322,22 @@ def main():
     log(datetime.now().strftime('🕒 %Y-%m-%d %H:%M:%S'))
 
     table = connect_db()
-    digests = fetch_candidates()
+    keyword_db = lancedb.connect(DB_URI)
+    typed_created_at = created_at_is_typed(table)
+    nested = nested_columns_enabled(table)
+    registry = DedupRegistry()
+    digests = fetch_candidates(registry)
     if not digests:
         log('✅ No digests found')
         return
 
+    # Candidates whose headers did not come back were not checked before download
+    processed_digests = registry.contains_many('newsbrief_digests', [digest['id'] for digest in digests])
+
     total_stories = 0
+    stories_inserted = 0
     for digest in digests:
-        if is_digest_processed(digest['id']):
+        if digest['id'] in processed_digests:
             log(f"⏭️  Already processed: {digest['subject'][:60]}")
             continue
 
@@ -628,46 +359,39 @@ def main():
             log('   ❌ No stories parsed from summary')
             continue
 
-        story_records = build_story_records(digest, stories)
-        # Check for existing stories before inserting
-
-        existing_df = table.to_pandas()
-
-        existing_ids = set(existing_df['id'].unique())
-
-        
-
-        # Filter out stories that already exist
-
-        new_story_records = []
-
-        for story in story_records:
-
-            if story['id'] not in existing_ids:
-
-                new_story_records.append(story)
+        story_records = build_story_records(digest, stories, typed_created_at, nested)
 
-        
+        # Check for existing stories before inserting (id index lookup, not a table scan)
+        existing_ids = existing_ids_in_table(table, [story['id'] for story in story_records])
+        new_story_records = [story for story in story_records if story['id'] not in existing_ids]
 
         if new_story_records:
-
-            table.add(pd.DataFrame(new_story_records))
-
+            table.add(feed_rows_to_arrow(table, new_story_records))
+            record_inserted(pd.DataFrame(new_story_records))
+            add_item_keywords(keyword_db, new_story_records)
+            stories_inserted += len(new_story_records)
             log(f"   ✅ Added {len(new_story_records)} new stories ({len(story_records) - len(new_story_records)} duplicates skipped)")
-
         else:
-
             log(f"   ℹ️ All {len(story_records)} stories already exist, skipping")
 
-        
-
-        # Original line (now replaced):
-
-        # table.add(pd.DataFrame(story_records))
-        mark_digest_processed(digest['id'])
+        registry.add_many('newsbrief_stories', [story['id'] for story in story_records])
+        registry.add('newsbrief_digests', digest['id'])
         total_stories += len(story_records)
         time.sleep(DELAY_SECONDS)
 
+    if stories_inserted:
+        log('📇 Refreshing feed indexes…')
+        refresh_indexes(table, log=log)
+        refresh_postings(keyword_db, log=log)
+        write_snapshot(table, log=log)
+        try:
+            RAGQueryEngine(keyword_db).embed_new(log=log)
+        except (ImportError, ValueError) as e:
+            log(f"   ⚠️ Embeddings not updated: {e}")
+
+    # Digests and stories older than the IMAP window cannot come back; drop those already stored
+    registry.maintain(table, {'newsbrief_digests': FETCH_WINDOW_DAYS, 'newsbrief_stories': FETCH_WINDOW_DAYS}, log=log)
+
     log('=' * 80)
     log(f"✅ Completed. Stories added: {total_stories}")
     log('=' * 80)
@@ -675,4 +399,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+RAG Query Engine EBS - Local embeddings and hybrid (BM25 + vector) retrieval over unified_feed
+Vectors live in the feed_embeddings side table (unified_feed is INSERT-only), one per item
+
+    python3 rag_query_engine_ebs.py embed             # embed rows not embedded yet (run after ingest)
+    python3 rag_query_engine_ebs.py embed --rebuild   # drop and re-embed everything (e.g. after switching model)
+    python3 rag_query_engine_ebs.py query "Petrobras dividendos"
+
+EBS_EMBEDDER selects the model: 'hashing' (deterministic stand-in, no dependencies) or a
+sentence-transformers model name such as 'paraphrase-multilingual-MiniLM-L12-v2' (CPU)
+"""
+import argparse
+import hashlib
+import os
+import re
+import time
+
+import lancedb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from lancedb.index import IvfPq
+
+from feed_cache_ebs import SOURCE_TYPES
+from feed_indexes_ebs import FTS_COLUMNS, LOOKUP_CHUNK, create_scalar_index, sql_quote
+from feed_schema_ebs import CREATED_AT_TYPE, created_at_is_typed, parse_created_at, time_range_where
+from feed_search_ebs import search_feed
+from item_flags_ebs import FLAGS_TABLE, FlagOverlayCache, junk_where
+from keyword_index_ebs import normalize_keyword
+
+DB_URI = os.getenv('EBS_LANCEDB_PATH', '/mnt/lancedb_clean')
+TABLE_NAME = os.getenv('EBS_LANCEDB_TABLE', 'unified_feed')
+EMBEDDINGS_TABLE = 'feed_embeddings'
+EMBEDDER = os.getenv('EBS_EMBEDDER', 'hashing')
+
+EMBED_BATCH = 64
+MAX_EMBED_CHARS = 2000
+# IVF-PQ needs enough vectors to train its centroids; below this a flat scan is exact and fast
+MIN_INDEX_ROWS = 256
+EMBEDDINGS_SCALAR_INDEXES = [
+    ('id', 'BTREE'),
+    ('source_type', 'BITMAP'),
+    ('created_at', 'BTREE'),
+]
+RRF_K = 60
+MAX_VECTOR_DISTANCE = 1.0
+VECTOR_NPROBES = 20
+VECTOR_REFINE_FACTOR = 5
+DOCUMENT_COLUMNS = ['id', 'source_type', 'source', 'created_at', 'title', 'sender_tag', 'ai_score',
+                    'themes', 'link', 'content_text']
+
+
+class HashingEmbedder:
+    """Signed feature hashing of accent-folded unigrams and bigrams; deterministic and dependency-free"""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        tokens = re.findall(r'\w+', normalize_keyword(text))
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text or ''):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+                vectors[row, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class SentenceTransformerEmbedder:
+    """sentence-transformers model on CPU; multilingual models cover the PT/EN mix"""
+
+    def __init__(self, model_name):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError('sentence-transformers is not installed; pip install sentence-transformers '
+                              'or set EBS_EMBEDDER=hashing')
+        self._model = SentenceTransformer(model_name, device='cpu')
+        self.dim = self._model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts):
+        return self._model.encode(list(texts), batch_size=EMBED_BATCH, normalize_embeddings=True,
+                                  convert_to_numpy=True).astype(np.float32)
+
+
+def get_embedder(name=EMBEDDER):
+    if name == 'hashing':
+        return HashingEmbedder()
+    return SentenceTransformerEmbedder(name)
+
+
+def embedding_text(row):
+    title = str(row.get('title') or '')
+    body = str(row.get('content_text') or '')
+    return f"{title}\n\n{body}"[:MAX_EMBED_CHARS]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """{name: [id, ...]} best first -> [(id, score, {name: rank})] sorted by fused score"""
+    scores = {}
+    ranks = {}
+    for name, ids in rankings.items():
+        for rank, item_id in enumerate(ids, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+            ranks.setdefault(item_id, {})[name] = rank
+    ordered = sorted(scores, key=lambda item_id: scores[item_id], reverse=True)
+    return [(item_id, scores[item_id], ranks[item_id]) for item_id in ordered]
+
+
+class RAGQueryEngine:
+    """Incremental embedding of unified_feed plus hybrid retrieval with reciprocal-rank fusion"""
+
+    def __init__(self, db, embedder=None, llm=None, table_fn=None):
+        # llm(question, context) -> answer text; optional, retrieval works without it
+        # table_fn(name) -> open table or None when missing; the API passes its pooled handles
+        self.db = db
+        self.embedder = embedder or get_embedder()
+        self.llm = llm
+        self._table_fn = table_fn or self._open_table
+        self._flags = FlagOverlayCache()
+
+    def _open_table(self, name):
+        try:
+            return self.db.open_table(name)
+        except ValueError:
+            return None
+
+    def _schema(self):
+        return pa.schema([
+            ('id', pa.string()),
+            ('source_type', pa.string()),
+            ('created_at', CREATED_AT_TYPE),
+            ('model', pa.string()),
+            ('vector', pa.list_(pa.float32(), self.embedder.dim)),
+        ])
+
+    def _embeddings(self, create=False):
+        if create:
+            table = self.db.create_table(EMBEDDINGS_TABLE, schema=self._schema(), exist_ok=True)
+        else:
+            table = self._table_fn(EMBEDDINGS_TABLE)
+            if table is None:
+                return None
+        if table.schema.field('vector').type.list_size != self.embedder.dim:
+            raise ValueError(f"{EMBEDDINGS_TABLE} holds vectors of another model; "
+                             f"run 'rag_query_engine_ebs.py embed --rebuild'")
+        return table
+
+    # Ingest side
+
+    def embed_new(self, rebuild=False, log=print):
+        """Embed every unified_feed row without a vector yet, EMBED_BATCH rows at a time"""
+        if rebuild:
+            self.db.drop_table(EMBEDDINGS_TABLE, ignore_missing=True)
+        feed = self.db.open_table(TABLE_NAME)
+        embeddings = self._embeddings(create=True)
+
+        feed_ids = feed.search().select(['id']).limit(None).to_arrow().column('id').to_pylist()
+        done = set(embeddings.search().select(['id']).limit(None).to_arrow().column('id').to_pylist())
+        pending = [item_id for item_id in feed_ids if item_id not in done]
+        if not pending:
+            log('   ✅ Embeddings up to date')
+            return 0
+
+        started = time.perf_counter()
+        columns = [name for name in ('id', 'title', 'content_text', 'source_type', 'created_at')
+                   if name in feed.schema.names]
+        for offset in range(0, len(pending), LOOKUP_CHUNK):
+            chunk = pending[offset:offset + LOOKUP_CHUNK]
+            id_list = ', '.join(sql_quote(item_id) for item_id in chunk)
+            rows = feed.search().where(f"id IN ({id_list})").select(columns).limit(None).to_arrow().to_pylist()
+            vectors = np.vstack([self.embedder.embed([embedding_text(row) for row in rows[start:start + EMBED_BATCH]])
+                                 for start in range(0, len(rows), EMBED_BATCH)])
+            created = parse_created_at([row.get('created_at') for row in rows])
+            # One append per lookup chunk keeps the fragment count down
+            embeddings.add(pa.table({
+                'id': [row['id'] for row in rows],
+                'source_type': [row.get('source_type') for row in rows],
+                'created_at': [None if pd.isna(ts) else ts.to_pydatetime() for ts in created],
+                'model': [self.embedder.name] * len(rows),
+                'vector': pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel(), pa.float32()),
+                                                            self.embedder.dim),
+            }, schema=self._schema()))
+        log(f"   ✅ Embedded {len(pending)} rows with {self.embedder.name} "
+            f"in {time.perf_counter() - started:.1f}s")
+        self._refresh_index(embeddings, log)
+        return len(pending)
+
+    def _refresh_index(self, embeddings, log):
+        rows = embeddings.count_rows()
+        if any(index.columns == ['vector'] for index in embeddings.list_indices()):
+            embeddings.optimize()
+            return
+        if rows < MIN_INDEX_ROWS:
+            return
+        embeddings.optimize()
+        dim = self.embedder.dim
+        num_sub_vectors = dim // 16 if dim % 16 == 0 else dim // 8
+        embeddings.create_index('vector', config=IvfPq(distance_type='cosine', num_partitions=max(1, int(rows ** 0.5)),
+                                                       num_sub_vectors=num_sub_vectors))
+        # Prefilters on the embeddings table would otherwise scan every row
+        for column, index_type in EMBEDDINGS_SCALAR_INDEXES:
+            create_scalar_index(embeddings, column, index_type)
+        log(f"   ✅ IVF-PQ index built over {rows} vectors")
+
+    # Query side
+
+    def _where(self, table, filters):
+        clauses = []
+        source_filter = filters.get('source', 'all')
+        if source_filter in SOURCE_TYPES:
+            clauses.append(f"source_type = '{source_filter}'")
+        range_where = time_range_where(table, filters.get('start'), filters.get('end'))
+        if range_where:
+            clauses.append(range_where)
+        return clauses
+
+    def retrieve(self, question, limit=10, filters=None):
+        """Fused ranking [(id, rrf_score, {'bm25': rank, 'vector': rank})] of non-junk items"""
+        filters = filters or {}
+        depth = max(limit * 4, 20)
+        feed = self._table_fn(TABLE_NAME)
+        overlay = self._flags.for_table(self._table_fn(FLAGS_TABLE))
+        rankings = {}
+
+        if set(FTS_COLUMNS) & {column for index in feed.list_indices() for column in index.columns}:
+            where = ' AND '.join(self._where(feed, filters) + [junk_where(overlay)])
+            start, end = filters.get('start'), filters.get('end')
+            # A range on an untyped created_at cannot be pushed down: rank every match, then keep those in range
+            if (start is not None or end is not None) and not created_at_is_typed(feed):
+                matches = search_feed(feed, question, ['id', 'created_at'], where, limit=None)
+                created = parse_created_at(matches.column('created_at').to_pylist())
+                keep = created.notna()
+                if start is not None:
+                    keep &= created >= start
+                if end is not None:
+                    keep &= created < end
+                matches = matches.filter(pa.array(keep.to_numpy())).slice(0, depth)
+            else:
+                matches = search_feed(feed, question, ['id'], where, limit=depth)
+            rankings['bm25'] = matches.column('id').to_pylist()
+
+        embeddings = self._embeddings()
+        if embeddings is not None:
+            query = embeddings.search(self.embedder.embed([question])[0].tolist(), vector_column_name='vector')
+            # PQ distances are approximate: probe a few partitions and re-rank the candidates exactly
+            query = query.distance_type('cosine').nprobes(VECTOR_NPROBES).refine_factor(VECTOR_REFINE_FACTOR)
+            where = ' AND '.join(self._where(embeddings, filters))
+            if where:
+                query = query.where(where, prefilter=True)
+            hits = query.select(['id', '_distance']).limit(depth).to_arrow()
+            # Cosine distance 1.0 means nothing in common with the question; not worth a rank
+            close = pc.less(hits.column('_distance'), MAX_VECTOR_DISTANCE)
+            ids = hits.filter(close).column('id').to_pylist()
+            # Junk lives on unified_feed and the overlay, not in the embeddings table
+            stored_junk = self._stored_junk(feed, ids)
+            rankings['vector'] = [item_id for item_id in ids
+                                  if not overlay.get('is_junk', item_id, item_id in stored_junk)]
+
+        return reciprocal_rank_fusion(rankings)[:limit]
+
+    def _stored_junk(self, feed, ids):
+        if not ids:
+            return set()
+        id_list = ', '.join(sql_quote(item_id) for item_id in ids)
+        result = feed.search().where(f"id IN ({id_list}) AND is_junk = true").select(['id']).limit(None).to_arrow()
+        return set(result.column('id').to_pylist())
+
+    def documents(self, ids, columns=DOCUMENT_COLUMNS):
+        """unified_feed rows for ids as an Arrow table, in the order of ids"""
+        if not ids:
+            return None
+        feed = self._table_fn(TABLE_NAME)
+        id_list = ', '.join(sql_quote(item_id) for item_id in ids)
+        columns = [name for name in columns if name in feed.schema.names]
+        rows = feed.search().where(f"id IN ({id_list})").select(columns).limit(None).to_arrow()
+        order = {item_id: position for position, item_id in enumerate(ids)}
+        positions = sorted(range(rows.num_rows), key=lambda row: order.get(rows.column('id')[row].as_py(), 0))
+        return rows.take(positions)
+
+    def build_context(self, rows, max_chars=12000):
+        parts = []
+        used = 0
+        for row in rows:
+            part = f"[{row['id']}] {row.get('title') or ''} ({row.get('created_at')})\n{row.get('content_text') or ''}"
+            if used + len(part) > max_chars:
+                break
+            parts.append(part)
+            used += len(part)
+        return '\n\n---\n\n'.join(parts)
+
+    def query(self, question, filters=None, limit=10):
+        ranked = self.retrieve(question, limit, filters)
+        documents = self.documents([item_id for item_id, _, _ in ranked])
+        rows = documents.to_pylist() if documents is not None else []
+        context = self.build_context(rows)
+        return {
+            'answer': self.llm(question, context) if self.llm and rows else None,
+            'sources': [{'id': item_id, 'score': round(score, 5), 'ranks': ranks} for item_id, score, ranks in ranked],
+            'context': context
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Embed unified_feed and run hybrid retrieval')
+    parser.add_argument('command', choices=['embed', 'query'])
+    parser.add_argument('text', nargs='?', default='')
+    parser.add_argument('--rebuild', action='store_true', help='embed: drop existing vectors first')
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    engine = RAGQueryEngine(lancedb.connect(DB_URI))
+    if args.command == 'embed':
+        print(f"🧠 Embedding {TABLE_NAME} at {DB_URI} with {engine.embedder.name}")
+        engine.embed_new(rebuild=args.rebuild)
+        return
+
+    started = time.perf_counter()
+    result = engine.query(args.text, limit=args.limit)
+    print(f"🔎 {len(result['sources'])} sources in {(time.perf_counter() - started) * 1000:.0f} ms")
+    for source in result['sources']:
+        print(f"   {source['score']:.4f}  {source['id']}  {source['ranks']}")
+
+
+if __name__ == '__main__':
+    main()
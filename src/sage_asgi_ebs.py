@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+SAGE ASGI EBS - Async serving mode for the SAGE interface (sage_ebs_clean.py)
+/api/stream is served natively: one coroutine per SSE client, no thread held while idle.
+Every other route runs the Flask app on a bounded thread pool; when the pool and its queue
+are full new requests get 503 + Retry-After, and a client that disconnects stops its
+response at the next chunk.
+
+    uvicorn --factory sage_asgi_ebs:create_app --host 0.0.0.0 --port 8545
+"""
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from feed_stream_ebs import KEEPALIVE_SECONDS, STREAM_POLL_SECONDS, backlog_event, format_sse
+
+WORKERS = int(os.getenv('EBS_ASGI_WORKERS', '8'))
+# Requests running or waiting for a worker; beyond this new requests are refused
+MAX_PENDING = int(os.getenv('EBS_ASGI_MAX_PENDING', '32'))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv('EBS_ASGI_QUEUE_TIMEOUT', '5'))
+MAX_STREAMS = int(os.getenv('EBS_ASGI_MAX_STREAMS', '1000'))
+RETRY_AFTER_SECONDS = 2
+# Chunks a worker may produce ahead of a slow client before it blocks
+BUFFERED_CHUNKS = 8
+
+_DONE = object()
+
+
+def _headers(pairs):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in pairs]
+
+
+async def _send_busy(send, message):
+    await send({'type': 'http.response.start', 'status': 503,
+                'headers': _headers([('Content-Type', 'application/json'),
+                                     ('Retry-After', str(RETRY_AFTER_SECONDS))])})
+    await send({'type': 'http.response.body', 'body': message})
+
+
+async def _read_body(receive):
+    """Request body, or None when the client went away before sending it"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+def _environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'], environ['SERVER_PORT'] = server[0], str(server[1])
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class WSGIBridge:
+    """Runs a WSGI app on a bounded pool; each response is produced by one worker thread
+
+    The whole response (view and body iteration) stays on one thread because Flask's
+    stream_with_context pushes its request context on the thread that starts the body.
+    """
+
+    def __init__(self, wsgi_app, executor, max_pending=MAX_PENDING):
+        self.wsgi_app = wsgi_app
+        self._executor = executor
+        self._slots = asyncio.Semaphore(max_pending)
+
+    def _run(self, environ, put, cancelled):
+        def start_response(status, headers, exc_info=None):
+            put(('start', int(status.split(' ', 1)[0]), headers))
+
+        try:
+            result = self.wsgi_app(environ, start_response)
+        except Exception:
+            put(('start', 500, [('Content-Type', 'application/json')]))
+            put(b'{"error":"Internal server error"}')
+            put(_DONE)
+            raise
+        try:
+            for chunk in result:
+                if cancelled.is_set():
+                    break
+                if chunk:
+                    put(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+            put(_DONE)
+
+    async def __call__(self, scope, receive, send):
+        body = await _read_body(receive)
+        if body is None:
+            return
+        try:
+            await asyncio.wait_for(self._slots.acquire(), QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            await _send_busy(send, b'{"error":"Server busy, retry shortly"}')
+            return
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        credits = threading.Semaphore(BUFFERED_CHUNKS)
+        cancelled = threading.Event()
+
+        def put(item):
+            # Called on the worker: blocks once BUFFERED_CHUNKS chunks wait for the client
+            if isinstance(item, bytes):
+                credits.acquire()
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            cancelled.set()
+            credits.release()
+            queue.put_nowait(_DONE)
+
+        future = loop.run_in_executor(self._executor, self._run, _environ(scope, body), put, cancelled)
+        # The slot is held until the worker is done, not just until the client is
+        future.add_done_callback(lambda _: self._slots.release())
+        watcher = asyncio.ensure_future(watch_disconnect())
+        started = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, tuple):
+                    _, status, headers = item
+                    await send({'type': 'http.response.start', 'status': status, 'headers': _headers(headers)})
+                    started = True
+                    continue
+                await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+                credits.release()
+            if started and not cancelled.is_set():
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            watcher.cancel()
+            if not future.done():
+                cancelled.set()
+                credits.release()
+
+
+class EventStream:
+    """Native /api/stream: same events as the Flask route, waiting on the loop instead of a thread"""
+
+    def __init__(self, watcher, backlog_fn, executor, max_streams=MAX_STREAMS):
+        self._watcher = watcher
+        self._backlog_fn = backlog_fn
+        self._executor = executor
+        self._max_streams = max_streams
+        self._open = 0
+
+    async def __call__(self, scope, receive, send):
+        if self._open >= self._max_streams:
+            await _send_busy(send, b'{"error":"Too many open streams"}')
+            return
+        loop = asyncio.get_running_loop()
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        since = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('since', [None])[0]
+        last_version = headers.get('last-event-id') or since
+        # Taken before the backlog so events published while it is built are not lost
+        last_seq = self._watcher.seq
+        # backlog_fn starts the watcher and may read the table: keep it off the loop
+        try:
+            backlog = await loop.run_in_executor(self._executor, self._backlog_fn, last_version)
+        except ValueError:
+            # A version that can no longer be read: reset the client as the Flask route does, since
+            # an error response would make EventSource stop reconnecting
+            backlog = (self._watcher.version, None)
+        except Exception as exc:
+            print(f"⚠️ Stream backlog error: {exc}", flush=True)
+            await send({'type': 'http.response.start', 'status': 500,
+                        'headers': _headers([('Content-Type', 'application/json')])})
+            await send({'type': 'http.response.body', 'body': b'{"error":"Internal server error"}'})
+            return
+
+        wake = asyncio.Event()
+        # Events published while the backlog was built fired no listener; check for them right away
+        wake.set()
+        disconnected = asyncio.Event()
+
+        def notify():
+            loop.call_soon_threadsafe(wake.set)
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+            wake.set()
+
+        self._open += 1
+        self._watcher.add_listener(notify)
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': _headers([
+                ('Content-Type', 'text/event-stream'),
+                ('Cache-Control', 'no-cache'),
+                ('X-Accel-Buffering', 'no'),
+            ])})
+            await self._send_event(send, f"retry: {STREAM_POLL_SECONDS * 1000}\n\n")
+            sent_version = -1
+            if backlog is not None:
+                sent_version = backlog[0]
+                await self._send_event(send, backlog_event(backlog))
+
+            while not disconnected.is_set():
+                try:
+                    await asyncio.wait_for(wake.wait(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    await self._send_event(send, ': keepalive\n\n')
+                    continue
+                wake.clear()
+                for seq, version, items in self._watcher.events_after(last_seq):
+                    last_seq = seq
+                    # Already covered by the backlog
+                    if version <= sent_version:
+                        continue
+                    await self._send_event(send, format_sse({'version': version, 'items': items},
+                                                            event='items', event_id=version))
+        finally:
+            self._open -= 1
+            self._watcher.remove_listener(notify)
+            watcher.cancel()
+
+    @staticmethod
+    async def _send_event(send, text):
+        await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+
+def create_app(workers=WORKERS, max_pending=MAX_PENDING):
+    """ASGI application wrapping sage_ebs_clean.app"""
+    import sage_ebs_clean
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sage-wsgi')
+    bridge = WSGIBridge(sage_ebs_clean.app, executor, max(max_pending, workers))
+    stream = EventStream(sage_ebs_clean.feed_watcher, sage_ebs_clean.stream_backlog, executor)
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+        if scope['path'] == '/api/stream' and scope['method'] == 'GET':
+            await stream(scope, receive, send)
+        else:
+            await bridge(scope, receive, send)
+
+    return app
@@ -1,12 +1,34 @@
-from flask import Flask, jsonify, render_template, request, make_response
+from flask import Flask, Response, g, jsonify, render_template, request, make_response, stream_with_context
 from flask_cors import CORS
-import lancedb
+from lancedb.query import ColumnOrdering
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from datetime import datetime
+import hashlib
 import json
 import math
+import numpy as np
+import os
 import re
 
+from detail_cache_ebs import ByteLRUCache
+from feed_cache_ebs import FeedSnapshotCache
+from feed_export_ebs import EXPORT_FORMATS, export_columns, export_where, iter_export
+from feed_indexes_ebs import sql_quote
+from feed_snapshot_file_ebs import MappedSnapshotFile, mapped_feed
+from feed_search_ebs import MAX_SEARCH_LIMIT, search_feed, search_where
+from feed_schema_ebs import (
+    KEYWORD_COLUMNS, KEYWORD_SEPARATOR, TZ_SUFFIX, created_at_is_typed, keyword_where, time_range_where
+)
+from feed_stats_ebs import COUNTERS, load_stats, reconcile as reconcile_stats
+from feed_stream_ebs import FeedWatcher, stream_events
+from json_response_ebs import json_response, negotiate_encoding
+from item_flags_ebs import FLAGS, FLAGS_TABLE, FlagOverlayCache, junk_where, set_flag
+from keyword_index_ebs import POSTINGS_TABLE, keyword_facets, keyword_item_ids
+from rag_query_engine_ebs import RAGQueryEngine
+from table_pool_ebs import TablePool
+
 app = Flask(__name__)
 CORS(app)
 
@@ -105,6 +127,20 @@ def _sanitize_datetime(value):
 
 
 
+def _keywords_text(value):
+    """themes/actors as the ' • '-joined text the UI shows, for string and list<string> columns alike"""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return KEYWORD_SEPARATOR.join(str(keyword) for keyword in value)
+    return _sanitize_str(value)
+
+
+def _custom_fields_value(value):
+    """Struct custom_fields are served as an object, legacy JSON strings unchanged"""
+    if isinstance(value, dict):
+        return {key: field for key, field in value.items() if field is not None}
+    return _sanitize_str(value)
+
+
 def _format_item(row):
     if hasattr(row, 'to_dict'):
         item = row.to_dict()
@@ -131,139 +167,754 @@ def _format_item(row):
         'ai_score': _sanitize_float(item.get('ai_score')),
         'ai_relevance_score': _sanitize_float(item.get('ai_relevance_score')),
         'enriched_content': _sanitize_str(enriched_content),
-        'actors': _sanitize_str(item.get('actors', '')),
-        'themes': _sanitize_str(item.get('themes', '')),
+        'actors': _keywords_text(item.get('actors', '')),
+        'themes': _keywords_text(item.get('themes', '')),
         'link': _sanitize_str(item.get('link', '')),
         'is_junk': bool(item.get('is_junk', False)),
         'is_attention': bool(item.get('is_attention', False)),
-        'custom_fields': _sanitize_str(item.get('custom_fields', ''))
+        'custom_fields': _custom_fields_value(item.get('custom_fields', ''))
     }
     return formatted
 
 
+def _str_column(df, name, default=''):
+    """Column-wide _sanitize_str"""
+    if name not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    col = df[name]
+    text = col.astype(object).where(col.notna(), '').astype(str)
+    return text.mask(text.str.strip().str.lower() == 'nat', '')
+
+
+def _custom_fields_column(df):
+    if 'custom_fields' not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    col = df['custom_fields']
+    present = col.dropna()
+    if len(present) and isinstance(present.iloc[0], dict):
+        # Already plain dicts (see _arrow_frame); nothing to parse
+        return col.astype(object).where(col.notna(), None)
+    return _str_column(df, 'custom_fields')
+
+
+def _arrow_frame(arrow):
+    """to_pandas for a LanceDB result, flattening nested columns into what the API serves:
+    list<string> keywords joined in Arrow, struct custom_fields as dicts without null members"""
+    custom_fields = None
+    for name in KEYWORD_COLUMNS:
+        if name in arrow.column_names and pa.types.is_list(arrow.schema.field(name).type):
+            index = arrow.schema.get_field_index(name)
+            arrow = arrow.set_column(index, name, pc.binary_join(arrow.column(name), KEYWORD_SEPARATOR))
+    if 'custom_fields' in arrow.column_names and pa.types.is_struct(arrow.schema.field('custom_fields').type):
+        custom_fields = arrow.column('custom_fields').to_pylist()
+        arrow = arrow.drop_columns(['custom_fields'])
+
+    df = arrow.to_pandas()
+    if custom_fields is not None:
+        df['custom_fields'] = pd.Series([_custom_fields_value(value) if value else None for value in custom_fields],
+                                        index=df.index, dtype=object)
+    return df
+
+
+def _float_column(df, name):
+    """Column-wide _sanitize_float"""
+    if name not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[name], errors='coerce').fillna(0.0).astype(float)
+
+
+def _bool_column(df, name):
+    if name not in df.columns:
+        return pd.Series(False, index=df.index)
+    col = df[name]
+    return col.astype(object).where(col.notna(), False).astype(bool)
+
+
+def _utc_iso_column(created):
+    seconds = created.dt.strftime('%Y-%m-%dT%H:%M:%S')
+    micro = created.dt.microsecond.fillna(0).astype(int)
+    fraction = ('.' + micro.astype(str).str.zfill(6)).where(micro > 0, '')
+    return seconds + fraction + 'Z'
+
+
+def _datetime_column(series):
+    """Column-wide _sanitize_datetime; also returns the parsed UTC timestamps used for sorting"""
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        # Typed created_at (migrate_feed_schema_ebs.py timestamps): no parsing or timezone guessing
+        created = series.dt.tz_convert('UTC')
+        formatted = _utc_iso_column(created).astype(object).where(created.notna(), '')
+        return formatted, created
+
+    text = series.astype(object).where(series.notna(), '').astype(str).str.strip()
+    blank = text.str.lower().isin(['', 'nat', 'nan'])
+    has_tz = text.str.contains(TZ_SUFFIX, regex=True)
+
+    created = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns, UTC]')
+    tz_rows = has_tz & ~blank
+    naive_rows = ~has_tz & ~blank
+    created.loc[tz_rows] = pd.to_datetime(text[tz_rows], utc=True, errors='coerce', format='ISO8601')
+    created.loc[naive_rows] = pd.to_datetime(
+        text[naive_rows], errors='coerce', format='ISO8601'
+    ).dt.tz_localize('UTC')
+
+    formatted = pd.Series('', index=text.index, dtype=object)
+    parsed = created.notna()
+    # Values without a timezone are UTC, as pd.to_datetime(x, utc=True) treated them; every row gets
+    # the same Z form so new Date() in the templates does not read some as browser-local time
+    formatted.loc[parsed] = _utc_iso_column(created)
+
+    # Anything the ISO parser rejected is parsed per value, as the old feed path did; values
+    # that still do not parse are served as ''
+    leftovers = ~parsed & ~blank
+    if leftovers.any():
+        created.loc[leftovers] = pd.to_datetime(
+            text[leftovers].map(lambda x: pd.to_datetime(x, utc=True, errors='coerce')), utc=True
+        )
+        reparsed = leftovers & created.notna()
+        formatted.loc[reparsed] = _utc_iso_column(created[reparsed])
+    return formatted, created
+
+
+def _sender_tag_column(sender, source):
+    """Column-wide _build_sender_tag"""
+    name = sender.where(~sender.str.contains('<', regex=False),
+                        sender.str.split('<', n=1).str[0].str.strip().str.strip('"'))
+    name = name.str.strip()
+    newsbrief = source.str.lower().str.contains('newsbrief', regex=False) & ~name.str.contains('Newsbrief', regex=False)
+    name = name.where(~newsbrief, name + ' - Newsbrief')
+    return name.where((name != '') & (sender != ''), 'Unknown')
+
+
+def _format_frame(df):
+    """Vectorized _format_item over a whole DataFrame; returns the formatted frame and UTC created_at"""
+    sender = _str_column(df, 'sender')
+    sender = sender.where(sender != '', _str_column(df, 'author'))
+    source = _str_column(df, 'source')
+    content_text = _str_column(df, 'content_text')
+    enriched_content = _str_column(df, 'enriched_content')
+    sender_tag = _str_column(df, 'sender_tag')
+    created_at, created_utc = _datetime_column(df['created_at'] if 'created_at' in df.columns
+                                               else pd.Series('', index=df.index, dtype=object))
+
+    formatted = pd.DataFrame({
+        'id': _str_column(df, 'id'),
+        'source_type': _str_column(df, 'source_type', 'email'),
+        'source': source,
+        'created_at': created_at,
+        'author': _str_column(df, 'author'),
+        'title': _str_column(df, 'title'),
+        'subject': _str_column(df, 'subject'),
+        'content_text': content_text.str.slice(0, 1000),
+        'content_html': _str_column(df, 'content_html'),
+        'sender': sender,
+        'sender_tag': sender_tag.where(sender_tag != '', _sender_tag_column(sender, source)),
+        'ai_score': _float_column(df, 'ai_score'),
+        'ai_relevance_score': _float_column(df, 'ai_relevance_score'),
+        'enriched_content': enriched_content.where(enriched_content != '', content_text),
+        'actors': _str_column(df, 'actors'),
+        'themes': _str_column(df, 'themes'),
+        'link': _str_column(df, 'link'),
+        'is_junk': _bool_column(df, 'is_junk'),
+        'is_attention': _bool_column(df, 'is_attention'),
+        'custom_fields': _custom_fields_column(df)
+    }, index=df.index)
+    return formatted, created_utc
+
 
 @app.route('/')
 def index():
     return render_template('sage_4.0_interface.html')
 
 
+# Columns _format_frame reads for ?fields=full; everything else stays on disk
+FEED_COLUMNS = [
+    'id', 'source_type', 'source', 'created_at', 'author', 'title', 'subject',
+    'content_text', 'content_html', 'sender', 'sender_tag', 'ai_score', 'ai_relevance_score',
+    'enriched_content', 'actors', 'themes', 'link', 'is_junk', 'is_attention', 'custom_fields'
+]
+
+# Compact list payload; content_html / enriched_content are loaded per card through
+# /api/email/<item_id> and /api/items
+LIST_FIELDS = [
+    'id', 'source_type', 'source', 'created_at', 'title', 'sender_tag', 'ai_score',
+    'is_junk', 'is_attention', 'themes', 'link', 'content_text', 'custom_fields'
+]
+# sender / author are only read to derive a missing sender_tag
+LIST_COLUMNS = LIST_FIELDS + ['sender', 'author']
+
+MAX_BATCH_IDS = 100
+
+
+def _apply_overlay(formatted, overlay):
+    """Replace stored is_junk / is_attention with the latest item_flags value per id"""
+    if overlay is None:
+        return formatted
+    for flag in FLAGS:
+        values = overlay.values[flag]
+        if values:
+            override = formatted['id'].map(values)
+            formatted[flag] = override.where(override.notna(), formatted[flag]).astype(bool)
+    return formatted
+
+
+def _build_feed_snapshot(table, where, fields, view, overlay):
+    wanted = FEED_COLUMNS if fields == 'full' else LIST_COLUMNS
+    columns = [name for name in wanted if name in table.schema.names]
+    query = table.search().where(where).select(columns).limit(None)
+    typed = created_at_is_typed(table)
+    if typed:
+        # Native timestamps sort inside LanceDB; NULL created_at goes last like NaT below
+        query = query.order_by([ColumnOrdering(column_name='created_at', ascending=False, nulls_first=False),
+                                ColumnOrdering(column_name='id', ascending=False)])
+    df = _arrow_frame(query.to_arrow())
+
+    formatted, created_utc = _format_frame(df)
+    formatted = _apply_overlay(formatted, overlay)
+    # where also matched every id with a junk flag; keep only rows whose effective value fits the view
+    keep = (formatted['is_junk'] == (view == 'junk')).to_numpy()
+    formatted, created_utc = formatted[keep], created_utc[keep]
+    if fields != 'full':
+        formatted = formatted[LIST_FIELDS]
+    # Nanoseconds whatever the unit of created_at, matching cursors and since= timestamps
+    formatted['_sort_key'] = pd.DatetimeIndex(created_utc).as_unit('ns').asi8
+    if not typed:
+        formatted = formatted.sort_values(['_sort_key', 'id'], ascending=False, kind='mergesort')
+
+    sort_keys = formatted.pop('_sort_key').to_numpy()
+    return sort_keys, formatted['id'].to_numpy(dtype=object), formatted.to_dict('records')
+
+
+def _format_snapshot_rows(arrow, overlay):
+    formatted, _ = _format_frame(_arrow_frame(arrow))
+    return _apply_overlay(formatted, overlay)[LIST_FIELDS].to_dict('records')
+
+
+# List-view snapshots come from the memory-mapped file ingest writes when it matches the table
+# version; workers then hold only row positions and format each page on demand
+_snapshot_file = MappedSnapshotFile()
+_feed_cache = FeedSnapshotCache(_build_feed_snapshot, mapped_feed(_snapshot_file, _format_snapshot_rows))
+_flag_cache = FlagOverlayCache()
+# One connection per worker; requests borrow table handles instead of reopening tables
+_tables = TablePool(DB_URI)
+
+
+def _pinned_table(name=TABLE_NAME):
+    """The request's handle on name (None if missing); the first call pins the version later reads see"""
+    handles = g.setdefault('table_handles', {})
+    if name not in handles:
+        handles[name] = _tables.checkout(name)
+    handle = handles[name]
+    return handle.table if handle is not None else None
+
+
+@app.teardown_request
+def _release_tables(exc):
+    for handle in g.pop('table_handles', {}).values():
+        if handle is not None:
+            _tables.release(handle)
+
+
+def _pinned_overlay():
+    return _flag_cache.for_table(_pinned_table(FLAGS_TABLE))
+
+# Cache-busting parameters the templates append; they never change the payload
+_ETAG_IGNORED_ARGS = {'v', 't'}
+
+
+def _feed_etag(version, flags_version, args, encoding=None, prefix='feed'):
+    query = '&'.join(f"{key}={value}" for key, value in sorted(args.items(multi=True))
+                     if key not in _ETAG_IGNORED_ARGS)
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()[:12]
+    # Each Content-Encoding is a different representation and gets its own validator
+    suffix = f"-{encoding}" if encoding else ''
+    return f"{prefix}-v{version}.{flags_version}-{digest}{suffix}"
+
+
+def _not_modified(etag):
+    """304 response when the client already holds etag, else None"""
+    if not request.if_none_match.contains(etag):
+        return None
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _load_ids_at_version(db):
+    def loader(version):
+        # A fresh handle: checking out an old version must not move a pooled one
+        table = db.open_table(TABLE_NAME)
+        table.checkout(version)
+        return set(table.search().select(['id']).limit(None).to_pandas()['id'].astype(str))
+    return loader
+
+
+def _feed_delta(db, snapshot, since):
+    """Items added after since, which is either a table version number or an ISO timestamp"""
+    if since.isdigit():
+        version = int(since)
+        if version >= snapshot.version:
+            return []
+        try:
+            old_ids = _feed_cache.ids_at(version, _load_ids_at_version(db))
+        except Exception as e:
+            raise ValueError(f"Version {version} is not available: {e}")
+        return snapshot.excluding(old_ids)
+
+    ts = pd.to_datetime(since, utc=True)
+    if pd.isna(ts):
+        raise ValueError(f"Invalid since value: {since}")
+    return snapshot.newer_than(ts.value)
+
+
+def _time_bound(value):
+    """UTC pd.Timestamp for an ISO start/end argument, None when absent"""
+    if not value:
+        return None
+    ts = pd.to_datetime(value, utc=True)
+    if pd.isna(ts):
+        raise ValueError(f"Invalid time bound: {value}")
+    return ts
+
+
 @app.route('/api/feed')
 def get_feed():
     view = request.args.get('view', 'default')
     source_filter = request.args.get('source', 'all')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
+    since = request.args.get('since')
+    fields = request.args.get('fields', 'list')
+    keyword = request.args.get('keyword', '').strip()
+    try:
+        start = _time_bound(request.args.get('start'))
+        end = _time_bound(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'items': []}), 400
 
     try:
-        db = lancedb.connect(DB_URI)
-        table = db.open_table(TABLE_NAME)
-        df = table.to_pandas()
+        table = _pinned_table()
+        overlay = _pinned_overlay()
+        encoding = negotiate_encoding(request)
+
+        # Unchanged table and flag versions mean an unchanged payload: answer the revalidation with 304
+        not_modified = _not_modified(_feed_etag(table.version, overlay.version, request.args, encoding))
+        if not_modified is not None:
+            return not_modified
+
+        # Rebuilt only when the table version moves; shared by every poll in between.
+        # A start/end range on a typed created_at is pushed into the LanceDB filter (one-off
+        # snapshot); an untyped range is sliced out of the shared snapshot.
+        range_where = time_range_where(table, start, end)
+        keyword_ids = keyword_item_ids(_pinned_table(POSTINGS_TABLE), keyword, start, end) if keyword else None
+        # Without a keyword_postings index, fall back to scanning themes
+        fallback_where = keyword_where(table, keyword) if keyword and keyword_ids is None else None
+        extra_where = ' AND '.join(clause for clause in (range_where, fallback_where) if clause)
+        snapshot = _feed_cache.get(table, source_filter, view, fields, overlay, extra_where=extra_where)
+        if keyword_ids is not None:
+            snapshot = snapshot.including(keyword_ids)
+        if range_where is None and (start is not None or end is not None):
+            snapshot = snapshot.between(start.value if start is not None else None,
+                                        end.value if end is not None else None)
+        try:
+            if since:
+                items, next_cursor = _feed_delta(_tables.db, snapshot, since), None
+            else:
+                items, next_cursor = snapshot.page(cursor, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'items': []}), 400
+
+        response = json_response({
+            'items': items,
+            'total': len(items) if since else len(snapshot.items),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'delta': bool(since),
+            'version': snapshot.version,
+            'timestamp': snapshot.built_at,
+            'database': 'EBS Clean'
+        }, encoding)
+        response.set_etag(_feed_etag(snapshot.version, snapshot.flags_version, request.args, encoding))
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e), 'items': []}), 500
 
-        # Filter by source
-        if source_filter == 'email':
-            df = df[df['source_type'] == 'email']
-        elif source_filter == 'tweet':
-            df = df[df['source_type'] == 'tweet']
 
-        # Filter by junk status
-        if view == 'junk':
-            df = df[df['is_junk'] == True]
-        else:
-            df = df[df['is_junk'] != True]
+@app.route('/api/keywords')
+def get_keywords():
+    """Keyword facets: /api/keywords?q=petro&start=...&end=...&limit=20 (empty q = most frequent)"""
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    try:
+        start = _time_bound(request.args.get('start'))
+        end = _time_bound(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'keywords': []}), 400
+
+    try:
+        facets = keyword_facets(_pinned_table(POSTINGS_TABLE), query, start, end, limit)
+        if facets is None:
+            return jsonify({'error': 'Keyword index not built (python3 keyword_index_ebs.py rebuild)',
+                            'keywords': []}), 503
+        return jsonify({'query': query, 'keywords': facets, 'total': len(facets)})
+    except Exception as e:
+        return jsonify({'error': str(e), 'keywords': []}), 500
 
-        if 'created_at' in df.columns:
-            # Convert each value individually so plain ISO strings without timezone are handled
-            df['created_at'] = df['created_at'].apply(lambda x: pd.to_datetime(x, utc=True, errors='coerce'))
-            df = df.sort_values('created_at', ascending=False, na_position='last')
 
-        items = []
-        for _, row in df.iterrows():
-            items.append(_format_item(row))
+@app.route('/api/search')
+def search_items():
+    """Full-text search: /api/search?q=...&source=email|tweet&start=&end=&junk=exclude|only|all&limit=&offset="""
+    text = request.args.get('q', '').strip()
+    source_filter = request.args.get('source', 'all')
+    junk = request.args.get('junk', 'exclude')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_SEARCH_LIMIT)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    if not text:
+        return jsonify({'error': 'q parameter is required', 'items': []}), 400
+    if junk not in ('exclude', 'only', 'all'):
+        return jsonify({'error': f'Invalid junk value: {junk}', 'items': []}), 400
+    try:
+        start = _time_bound(request.args.get('start'))
+        end = _time_bound(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e), 'items': []}), 400
 
-        response = make_response(jsonify({
-            'items': items,
-            'total': len(items),
-            'timestamp': datetime.now().isoformat(),
-            'database': 'EBS Clean'
-        }))
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
+    try:
+        table = _pinned_table()
+        overlay = _pinned_overlay()
+        encoding = negotiate_encoding(request)
+        etag = _feed_etag(table.version, overlay.version, request.args, encoding, prefix='search')
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+
+        junk_clause = None if junk == 'all' else junk_where(overlay, junk == 'only')
+        where = search_where(table, source_filter, start, end, junk_clause)
+        columns = [name for name in LIST_COLUMNS if name in table.schema.names]
+
+        # A range on an untyped created_at cannot be pushed down: filter all matches, then page
+        range_in_python = (start is not None or end is not None) and not created_at_is_typed(table)
+        if range_in_python:
+            df = _arrow_frame(search_feed(table, text, columns, where, limit=None))
+        else:
+            df = _arrow_frame(search_feed(table, text, columns, where, limit=limit + 1, offset=offset))
+
+        formatted, created_utc = _format_frame(df)
+        formatted = _apply_overlay(formatted, overlay)[LIST_FIELDS]
+        formatted['score'] = df['_score'].astype(float).round(4)
+        if range_in_python:
+            keep = created_utc.notna()
+            if start is not None:
+                keep &= created_utc >= start
+            if end is not None:
+                keep &= created_utc < end
+            formatted = formatted[keep.to_numpy()].iloc[offset:offset + limit + 1]
+
+        items = formatted.to_dict('records')
+        has_more = len(items) > limit
+        response = json_response({
+            'query': text,
+            'items': items[:limit],
+            'offset': offset,
+            'limit': limit,
+            'has_more': has_more,
+            'next_offset': offset + limit if has_more else None
+        }, encoding)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
         return response
     except Exception as e:
         return jsonify({'error': str(e), 'items': []}), 500
 
 
+@app.route('/api/export')
+def export_feed():
+    """Bulk columnar export: /api/export?format=arrow|parquet&columns=id,title&source=&start=&end=&junk="""
+    fmt = request.args.get('format', 'arrow')
+    junk = request.args.get('junk', 'exclude')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Invalid format: {fmt}'}), 400
+    if junk not in ('exclude', 'only', 'all'):
+        return jsonify({'error': f'Invalid junk value: {junk}'}), 400
+
+    try:
+        table = _pinned_table()
+        overlay = _pinned_overlay()
+        requested = [name for name in request.args.get('columns', '').split(',') if name]
+        columns = export_columns(table, requested)
+        where = export_where(table, request.args.get('source', 'all'), _time_bound(request.args.get('start')),
+                             _time_bound(request.args.get('end')), junk, overlay)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    # stream_with_context keeps the pinned handle checked out until the last batch is written
+    response = Response(stream_with_context(iter_export(table, columns, where, fmt, overlay)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{TABLE_NAME}-v{table.version}.{extension}"'
+    response.headers['X-Table-Version'] = str(table.version)
+    return response
+
+
+_rag_engine = None
+
+
+def _get_rag_engine():
+    # Built on first use: loading a sentence-transformers model takes seconds
+    global _rag_engine
+    if _rag_engine is None:
+        _rag_engine = RAGQueryEngine(_tables.db, table_fn=_pinned_table)
+    return _rag_engine
+
+
+@app.route('/api/rag')
+def rag_retrieve():
+    """Hybrid BM25 + vector retrieval for RAG: /api/rag?q=...&source=email|tweet&start=&end=&limit="""
+    text = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_SEARCH_LIMIT)
+    if not text:
+        return jsonify({'error': 'q parameter is required', 'items': []}), 400
+    try:
+        filters = {
+            'source': request.args.get('source', 'all'),
+            'start': _time_bound(request.args.get('start')),
+            'end': _time_bound(request.args.get('end')),
+        }
+    except ValueError as e:
+        return jsonify({'error': str(e), 'items': []}), 400
+
+    try:
+        engine = _get_rag_engine()
+        ranked = engine.retrieve(text, limit, filters)
+        if not ranked:
+            return jsonify({'query': text, 'items': []})
+        documents = engine.documents([item_id for item_id, _, _ in ranked], LIST_COLUMNS)
+        formatted, _ = _format_frame(_arrow_frame(documents))
+        formatted = _apply_overlay(formatted, _pinned_overlay())[LIST_FIELDS]
+        fused = {item_id: (score, ranks) for item_id, score, ranks in ranked}
+        items = formatted.to_dict('records')
+        for item in items:
+            score, ranks = fused[item['id']]
+            item['score'] = round(score, 5)
+            item['ranks'] = ranks
+        return jsonify({'query': text, 'items': items})
+    except Exception as e:
+        return jsonify({'error': str(e), 'items': []}), 500
+
+
+def _latest_version():
+    with _tables.table(TABLE_NAME, refresh=True) as table:
+        return table.version
+
+
+def _stream_delta(since_version):
+    # Runs on the watcher thread as well as in requests, so it borrows its own handles
+    with _tables.table(TABLE_NAME) as table, _tables.table(FLAGS_TABLE) as flags_table:
+        snapshot = _feed_cache.get(table, overlay=_flag_cache.for_table(flags_table))
+    return snapshot.version, _feed_delta(_tables.db, snapshot, str(since_version))
+
+
+# Shared by the Flask SSE route and the native one in sage_asgi_ebs
+feed_watcher = FeedWatcher(_latest_version, _stream_delta)
+
+
+def stream_backlog(last_version):
+    """Catch-up (version, items) for an SSE client that last saw last_version, else None
+
+    items is None when last_version has been pruned (every ingest optimizes the table): the
+    client gets a reset event and reloads /api/feed, since an error response would make
+    EventSource give up reconnecting.
+    """
+    feed_watcher.start()
+    if last_version and last_version.isdigit() and int(last_version) < feed_watcher.version:
+        try:
+            return _stream_delta(int(last_version))
+        except ValueError:
+            return feed_watcher.version, None
+    return None
+
+
+@app.route('/api/stream')
+def stream_feed():
+    """Server-Sent Events: one 'items' event per table version that adds non-junk rows"""
+    # Taken before the backlog so events published while it is built are not lost
+    last_seq = feed_watcher.seq
+    try:
+        # Reconnecting EventSource clients send the last version they saw
+        backlog = stream_backlog(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    response = Response(stream_with_context(stream_events(feed_watcher, last_seq, backlog)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/api/stats')
 def get_stats():
     try:
-        db = lancedb.connect(DB_URI)
-        table = db.open_table(TABLE_NAME)
-        df = table.to_pandas()
-
-        stats = {
-            'total_items': len(df),
-            'email_digests': len(df[df['source'] == 'email_digest']),
-            'newsbrief_stories': len(df[df['source'] == 'newsbrief_story']),
-            'tweets': len(df[df['source_type'] == 'tweet']),
-            'with_ai_scores': len(df[df['ai_score'].notna()]),
-            'with_keywords': len(df[df['themes'].notna()]),
-            'database': 'EBS Clean (INSERT-only)'
-        }
+        counters = load_stats()
+        if counters is None:
+            # First request on a fresh deployment; ingest keeps the counters current afterwards
+            counters = reconcile_stats(_pinned_table())
+
+        stats = {name: counters.get(name, 0) for name in COUNTERS}
+        stats['updated_at'] = counters.get('updated_at')
+        stats['database'] = 'EBS Clean (INSERT-only)'
         return jsonify(stats)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _created_at_value(value):
+    """One created_at in the list views' UTC 'Z' form, so detail and list agree on the time"""
+    return _datetime_column(pd.Series([value]))[0].iloc[0]
+
+
+def _detail_payload(item):
+    source = item.get('source', '')
+    sender = item.get('sender') or item.get('author')
+
+    return {
+        'id': str(item.get('id', '')),
+        'source_type': str(item.get('source_type', 'email')),
+        'title': str(item.get('title', '')),
+        'sender_tag': str(item.get('sender_tag') or _build_sender_tag(sender, source)),
+        'created_at': _created_at_value(item.get('created_at')),
+        'content_html': str(item.get('content_html', '')),
+        'content_text': str(item.get('content_text', '')),
+        'enriched_content': str(item.get('enriched_content', '')),
+        'actors': _keywords_text(item.get('actors', '')),
+        'themes': _keywords_text(item.get('themes', '')),
+        'link': str(item.get('link', '')),
+        'is_junk': bool(item.get('is_junk', False)),
+        'is_attention': bool(item.get('is_attention', False)),
+        'ai_score': _sanitize_float(item.get('ai_score'))
+    }
+
+
+# Serialized detail payloads by id with the stored flags; rows are insert-only, so entries never go
+# stale. The item_flags overlay changes under other workers and is applied on every read instead
+_detail_cache = ByteLRUCache(int(os.getenv('EBS_DETAIL_CACHE_BYTES', 64 * 1024 * 1024)))
+
+
+def _detail_json(item):
+    return app.json.dumps(_detail_payload(item)).encode('utf-8')
+
+
+def _with_flags(item_id, body, overlay):
+    """Cached detail bytes with the current overlay flags; re-encoded only for overridden ids"""
+    if not any(item_id in overlay.values[flag] for flag in FLAGS):
+        return body
+    payload = app.json.loads(body)
+    for flag in FLAGS:
+        payload[flag] = overlay.get(flag, item_id, payload[flag])
+    return app.json.dumps(payload).encode('utf-8')
+
+
+def _json_bytes_response(body):
+    return Response(body, mimetype='application/json')
+
+
 @app.route('/api/email/<item_id>')
 def get_email_detail(item_id):
     try:
-        db = lancedb.connect(DB_URI)
-        table = db.open_table(TABLE_NAME)
-        result = table.search().where(f"id = '{item_id}'").limit(1).to_pandas()
-
-        if result.empty:
-            return jsonify({'error': 'Item not found'}), 404
-
-        item = result.iloc[0].to_dict()
-        source = item.get('source', '')
-        sender = item.get('sender') or item.get('author')
-
-        response_data = {
-            'id': str(item.get('id', '')),
-            'source_type': str(item.get('source_type', 'email')),
-            'title': str(item.get('title', '')),
-            'sender_tag': str(item.get('sender_tag') or _build_sender_tag(sender, source)),
-            'created_at': str(item.get('created_at', '')),
-            'content_html': str(item.get('content_html', '')),
-            'content_text': str(item.get('content_text', '')),
-            'enriched_content': str(item.get('enriched_content', '')),
-            'actors': str(item.get('actors', '')),
-            'themes': str(item.get('themes', '')),
-            'link': str(item.get('link', '')),
-            'is_junk': bool(item.get('is_junk', False)),
-            'is_attention': bool(item.get('is_attention', False)),
-            'ai_score': float(item.get('ai_score', 0)) if item.get('ai_score') not in (None, '') else 0.0
-        }
+        body = _detail_cache.get(item_id)
+        if body is None:
+            table = _pinned_table()
+            result = _arrow_frame(table.search().where(f"id = {sql_quote(item_id)}").limit(1).to_arrow())
+
+            if result.empty:
+                return jsonify({'error': 'Item not found'}), 404
 
-        return jsonify(response_data)
+            body = _detail_json(result.iloc[0].to_dict())
+            _detail_cache.put(item_id, body)
+        return _json_bytes_response(_with_flags(item_id, body, _pinned_overlay()))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/items')
+def get_items_detail():
+    """Batch detail lookup: /api/items?ids=a,b,c (or repeated ids=) in one round trip"""
+    ids = []
+    for value in request.args.getlist('ids'):
+        ids.extend(part for part in value.split(',') if part)
+    ids = list(dict.fromkeys(ids))
+
+    if not ids:
+        return jsonify({'error': 'ids parameter is required', 'items': []}), 400
+    if len(ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} ids per request', 'items': []}), 400
+
+    found = {}
+    for item_id in ids:
+        cached = _detail_cache.get(item_id)
+        if cached is not None:
+            found[item_id] = cached
+
+    try:
+        pending = [item_id for item_id in ids if item_id not in found]
+        if pending:
+            table = _pinned_table()
+            id_list = ', '.join(sql_quote(item_id) for item_id in pending)
+            result = _arrow_frame(table.search().where(f"id IN ({id_list})").limit(None).to_arrow())
+
+            for item in result.to_dict('records'):
+                item_id = str(item.get('id', ''))
+                if item_id not in found:
+                    found[item_id] = _detail_json(item)
+                    _detail_cache.put(item_id, found[item_id])
+
+        # Splice the cached payload bytes straight into the response body
+        overlay = _pinned_overlay()
+        items = b','.join(_with_flags(item_id, found[item_id], overlay) for item_id in ids if item_id in found)
+        missing = app.json.dumps([item_id for item_id in ids if item_id not in found]).encode('utf-8')
+        return _json_bytes_response(b'{"items":[' + items + b'],"missing":' + missing + b'}')
+    except Exception as e:
+        return jsonify({'error': str(e), 'items': []}), 500
+
+
+def _set_item_flag(item_id, flag, value):
+    set_flag(_tables.db, item_id, flag, value)
+    _tables.touch(FLAGS_TABLE)
+
+
 @app.route('/api/mark_junk/<item_id>', methods=['POST'])
 def mark_junk(item_id):
     try:
-        db = lancedb.connect(DB_URI)
-        table = db.open_table(TABLE_NAME)
-        df = table.to_pandas()
-        df.loc[df['id'] == item_id, 'is_junk'] = True
+        _set_item_flag(item_id, 'is_junk', True)
+        return jsonify({'status': 'marked as junk'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        junk_item = df[df['id'] == item_id].copy()
-        if not junk_item.empty:
-            junk_item['is_junk'] = True
-            junk_item['id'] = f"{item_id}_junk_{datetime.now().timestamp()}"
-            table.add(junk_item)
 
-        return jsonify({'status': 'marked as junk'})
+@app.route('/api/unmark_junk/<item_id>', methods=['POST'])
+def unmark_junk(item_id):
+    try:
+        _set_item_flag(item_id, 'is_junk', False)
+        return jsonify({'status': 'restored'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/toggle_attention/<item_id>', methods=['POST'])
+def toggle_attention(item_id):
+    try:
+        current = _pinned_overlay().get('is_attention', item_id)
+        if current is None:
+            table = _pinned_table()
+            columns = [name for name in ('id', 'is_attention') if name in table.schema.names]
+            result = table.search().where(f"id = {sql_quote(item_id)}").select(columns).limit(1).to_pandas()
+            if result.empty:
+                return jsonify({'error': 'Item not found'}), 404
+            current = bool(_bool_column(result, 'is_attention').iloc[0])
+
+        _set_item_flag(item_id, 'is_attention', not current)
+        return jsonify({'status': 'ok', 'is_attention': not current})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
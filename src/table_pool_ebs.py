@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Table Pool EBS - One LanceDB connection per process and a pool of reusable table handles
+Handles follow the latest version with checkout_latest at most every EBS_TABLE_REFRESH_SECONDS
+instead of paying connect() + open_table() manifest reads on every request
+"""
+import os
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+import lancedb
+
+REFRESH_SECONDS = float(os.getenv('EBS_TABLE_REFRESH_SECONDS', '1.0'))
+
+
+class TableHandle:
+    """One open table, used by a single request at a time"""
+
+    def __init__(self, name, table, checked_at, generation):
+        self.name = name
+        self.table = table
+        self.checked_at = checked_at
+        self.generation = generation
+
+
+class TablePool:
+    """Reusable table handles on one shared connection
+
+    A checked-out handle stays at one version until it is released, so every read a request
+    makes through it sees the same version. touch(name) after a write in this process makes
+    the next checkout move to the new version; writes from other processes (ingest) show up
+    within refresh_seconds.
+    """
+
+    def __init__(self, uri, refresh_seconds=REFRESH_SECONDS):
+        self.uri = uri
+        self._refresh_seconds = refresh_seconds
+        self._db = None
+        self._lock = Lock()
+        self._idle = {}
+        self._generations = {}
+        self._missing = {}
+
+    @property
+    def db(self):
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = lancedb.connect(self.uri)
+        return self._db
+
+    def touch(self, name):
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+            self._missing.pop(name, None)
+
+    def checkout(self, name, refresh=False):
+        """A handle on name at most refresh_seconds behind; None while the table does not exist"""
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generations.get(name, 0)
+            idle = self._idle.get(name)
+            handle = idle.pop() if idle else None
+            missing_since = self._missing.get(name)
+        if handle is None:
+            # Missing tables (item_flags before the first mark) are looked up again after the interval
+            if missing_since is not None and not refresh and now - missing_since < self._refresh_seconds:
+                return None
+            try:
+                table = self.db.open_table(name)
+            except ValueError:
+                with self._lock:
+                    self._missing[name] = now
+                return None
+            return TableHandle(name, table, now, generation)
+
+        if refresh or handle.generation != generation or now - handle.checked_at >= self._refresh_seconds:
+            handle.table.checkout_latest()
+            handle.checked_at = now
+            handle.generation = generation
+        return handle
+
+    def release(self, handle):
+        with self._lock:
+            self._idle.setdefault(handle.name, []).append(handle)
+
+    @contextmanager
+    def table(self, name, refresh=False):
+        """with pool.table(name) as table: ... for code outside a request"""
+        handle = self.checkout(name, refresh)
+        try:
+            yield handle.table if handle is not None else None
+        finally:
+            if handle is not None:
+                self.release(handle)
@@ -25,15 +25,13 @@ def main():
 
     db = lancedb.connect(EBS_DB)
     table = db.open_table('unified_feed')
-    df = table.to_pandas()
 
     # Find candidates: tweets with AI score 1-3 that aren't already junk
-    candidates = df[
-        (df['source_type'] == 'tweet') &
-        (df['ai_score'] > 0) &
-        (df['ai_score'] <= JUNK_THRESHOLD) &
-        (df['is_junk'] == False)
-    ].sort_values('ai_score')
+    # (filter pushed down to the source_type / is_junk bitmap indexes)
+    candidates = table.search().where(
+        f"source_type = 'tweet' AND ai_score > 0 AND ai_score <= {JUNK_THRESHOLD} AND is_junk = false"
+    ).select(['id', 'sender_tag', 'title', 'content_text', 'ai_score']).limit(None).to_pandas()
+    candidates = candidates.sort_values('ai_score')
 
     print(f"📊 Found {len(candidates)} tweets with ai_score <= {JUNK_THRESHOLD}\n")
 
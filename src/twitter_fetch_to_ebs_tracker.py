@@ -9,7 +9,6 @@ import os
 import sys
 import time
 from datetime import datetime, timezone
-from pathlib import Path
 
 import lancedb
 import pandas as pd
@@ -20,6 +19,16 @@ if HANDLERS_DIR not in sys.path:
     sys.path.insert(0, HANDLERS_DIR)
 
 from tweet_keyword_handler import extract_tweet_keywords  # noqa: E402
+from dedup_registry_ebs import FETCH_WINDOWS, DedupRegistry  # noqa: E402
+from feed_indexes_ebs import existing_ids as existing_ids_in_table, refresh_indexes  # noqa: E402
+from feed_schema_ebs import (  # noqa: E402
+    created_at_is_typed, created_at_value, custom_fields_value, feed_rows_to_arrow, keywords_value,
+    nested_columns_enabled
+)
+from feed_snapshot_file_ebs import write_snapshot  # noqa: E402
+from feed_stats_ebs import record_inserted  # noqa: E402
+from keyword_index_ebs import add_item_keywords, refresh_postings  # noqa: E402
+from rag_query_engine_ebs import RAGQueryEngine  # noqa: E402
 
 print("🐦 EBS Twitter Fetcher (media aware, enriched insert-only)")
 print("=" * 80)
@@ -30,6 +39,7 @@ FETCH_COUNT = int(os.getenv("TWITTER_FETCH_COUNT", "30"))
 EBS_DB = os.getenv("EBS_LANCEDB_PATH", "/mnt/lancedb_clean")
 EBS_TABLE = os.getenv("EBS_LANCEDB_TABLE", "unified_feed")
 TRACKER_FILE = os.getenv("EBS_TRACKER_FILE", "/home/ubuntu/newspaper_project/processed_ids_ebs.json")
+TRACKER_DB = os.getenv("EBS_TRACKER_DB", "/home/ubuntu/newspaper_project/processed_ids_ebs.sqlite3")
 EXCLUSIONS_PATH = os.getenv("KEYWORD_EXCLUSIONS_PATH", "/home/ubuntu/newspaper_project/keyword_exclusions.json")
 ANTHROPIC_KEY = os.getenv("ANTHROPIC_API_KEY")
 
@@ -42,20 +52,14 @@ if not os.path.exists(EXCLUSIONS_PATH):
 with open(EXCLUSIONS_PATH, "r", encoding="utf-8") as f:
     keyword_exclusions = json.load(f)
 
-tracker_path = Path(TRACKER_FILE)
-if tracker_path.exists():
-    processed_ids = set(json.loads(tracker_path.read_text()).get("tweets", []))
-else:
-    processed_ids = set()
-print(f"Tracker entries: {len(processed_ids)}")
+# Shared with the NewsBrief batch; the old JSON tracker is imported on first use
+registry = DedupRegistry(TRACKER_DB, TRACKER_FILE)
 
 print(f"Connecting to LanceDB table {EBS_TABLE} at {EBS_DB}...")
 db = lancedb.connect(EBS_DB)
 table = db.open_table(EBS_TABLE)
-
-existing_df = table.search().where("source_type = \"tweet\"").limit(5000).to_pandas()
-existing_ids = set(existing_df["id"].tolist()) if not existing_df.empty else set()
-print(f"Existing tweets already stored: {len(existing_ids)}\n")
+typed_created_at = created_at_is_typed(table)
+nested = nested_columns_enabled(table)
 
 print(f"Fetching {FETCH_COUNT} tweets from TwitterAPI.io list {LIST_ID}\n")
 url = "https://api.twitterapi.io/twitter/list/tweets"
@@ -72,6 +76,12 @@ data = response.json()
 tweets = data.get("tweets", [])
 print(f"Retrieved {len(tweets)} tweets\n")
 
+# Only the fetched ids are looked up: one registry round, then the id index
+fetched_ids = [f"tweet_{tweet.get('id')}" for tweet in tweets]
+processed_ids = registry.contains_many("tweets", fetched_ids)
+existing_ids = existing_ids_in_table(table, [tweet_id for tweet_id in fetched_ids if tweet_id not in processed_ids])
+print(f"Already processed: {len(processed_ids)}, already stored: {len(existing_ids)}\n")
+
 new_rows = []
 media_tweets = 0
 enriched = 0
@@ -91,17 +101,17 @@ for tweet in tweets:
     first_url = (urls[0].get("expanded_url") or urls[0].get("url")) if urls else ""
 
     created_raw = tweet.get("createdAt", tweet.get("created_at", ""))
-    created_iso = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
+    created_dt = datetime.now(timezone.utc)
     if created_raw:
         try:
-            dt = datetime.strptime(created_raw, "%a %b %d %H:%M:%S %z %Y")
-            created_iso = dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+            created_dt = datetime.strptime(created_raw, "%a %b %d %H:%M:%S %z %Y")
         except ValueError:
             try:
-                dt = datetime.fromisoformat(created_raw.replace("Z", "+00:00"))
-                created_iso = dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+                created_dt = datetime.fromisoformat(created_raw.replace("Z", "+00:00"))
             except ValueError:
                 pass
+    if created_dt.tzinfo is None:
+        created_dt = created_dt.replace(tzinfo=timezone.utc)
 
     media_list = []
     extended_entities = tweet.get("extendedEntities", {})
@@ -138,7 +148,6 @@ for tweet in tweets:
 
     enrichment = extract_tweet_keywords(text, ANTHROPIC_KEY, keyword_exclusions)
     keywords = enrichment.get("keywords") or []
-    keywords_str = " • ".join(keywords)
     ai_score = float(enrichment.get("score", 0) or 0.0)
     language = enrichment.get("language", "en")
     enriched += 1
@@ -166,7 +175,7 @@ for tweet in tweets:
             "id": tweet_id,
             "source_type": "tweet",
             "source": "twitter_api",
-            "created_at": created_iso,
+            "created_at": created_at_value(created_dt, typed_created_at),
             "author": display_name,
             "sender": f"@{username}",
             "title": text[:100] + ("..." if len(text) > 100 else ""),
@@ -174,8 +183,8 @@ for tweet in tweets:
             "content_text": text,
             "content_html": "",
             "tags": "",
-            "themes": keywords_str,
-            "actors": keywords_str,
+            "themes": keywords_value(keywords, nested),
+            "actors": keywords_value(keywords, nested),
             "ai_score": ai_score,
             "sentiment": None,
             "category": "tweet",
@@ -183,7 +192,7 @@ for tweet in tweets:
             "parent_id": "",
             "story_number": 0,
             "is_junk": is_junk,
-            "custom_fields": json.dumps(custom_fields),
+            "custom_fields": custom_fields_value(custom_fields, nested),
             "sender_tag": f"@{username}",
             "enriched_content": text,
             "link": first_url,
@@ -194,14 +203,24 @@ for tweet in tweets:
 
 if new_rows:
     print(f"Saving {len(new_rows)} tweets ({media_tweets} with media, enriched={enriched})")
-    df = pd.DataFrame(new_rows)
-    table.add(df)
-    processed_ids.update(row["id"] for row in new_rows)
-    tracker_path.write_text(json.dumps({"tweets": sorted(list(processed_ids))}, indent=2))
+    table.add(feed_rows_to_arrow(table, new_rows))
+    record_inserted(pd.DataFrame(new_rows))
+    add_item_keywords(db, new_rows)
+    registry.add_many("tweets", [row["id"] for row in new_rows])
     print("Tweets saved to LanceDB\n")
+    refresh_indexes(table)
+    refresh_postings(db)
+    write_snapshot(table)
+    try:
+        RAGQueryEngine(db).embed_new()
+    except (ImportError, ValueError) as e:
+        print(f"⚠️ Embeddings not updated: {e}")
 else:
     print("No new tweets to save (all already processed)\n")
 
+# Tweets past the list horizon that are already stored leave the registry (at most daily)
+registry.maintain(table, {"tweets": FETCH_WINDOWS["tweets"]})
+
 print("=" * 80)
 print("🎉 EBS twitter fetch complete")
 print("=" * 80)